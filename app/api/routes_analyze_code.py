@@ -3,11 +3,17 @@ Routes for code analysis endpoint.
 Analyzes code snippets for potential issues using Gemini API.
 """
 
-from fastapi import APIRouter
+import json
+from fastapi import APIRouter, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
-from app.services import analyze_code as analyze_code_service
-from app.api.routes_code_input import get_stored_code
+from typing import List, Literal, Optional
+from app.services import analyze_code as analyze_code_service, map_snippets
+from app.services import stream_analyze_code as stream_analyze_code_service
+from app.api.routes_code_input import get_stored_code, get_stored_snippets, snippet_line_offsets
+from app.scheduler import OverloadedError
+from app.schemas import IssueDetail
+from app.tokens import TokenBudgetError
 
 router = APIRouter()
 
@@ -23,16 +29,50 @@ class AnalyzeCodeRequest(BaseModel):
         description="Gemini API key. If not provided, uses API_KEY from environment variables.",
         examples=[None]
     )
+    batch: bool = Field(
+        default=False,
+        description="Analyze each snippet stored via /code-input as an independent call. Ignored when code is provided."
+    )
+    incremental: bool = Field(
+        default=False,
+        description="Only send changed top-level functions/classes upstream and reuse cached issues for unchanged ones"
+    )
+    compress: Optional[bool] = Field(
+        default=None,
+        description="Strip comments, docstrings and blank lines before prompting. Line numbers still refer to the submitted code. Defaults to the server setting."
+    )
+    latency_budget: Optional[float] = Field(
+        default=None,
+        description="Seconds the client is willing to wait. Small budgets route the request to the fast model tier.",
+        gt=0
+    )
 
 
-class IssueDetail(BaseModel):
-    """Model for individual code issue."""
-    title: str
-    type: str
-    severity: str
-    lineNumber: Optional[int] = None
-    description: str
-    suggestedFix: str
+class AnalyzeCodeStreamRequest(BaseModel):
+    """Request model for streaming code analysis."""
+    code: Optional[str] = Field(
+        default=None,
+        description="Code snippet to analyze. If not provided, uses stored code from /code-input"
+    )
+    api_key: Optional[str] = Field(
+        default=None,
+        description="Gemini API key. If not provided, uses API_KEY from environment variables.",
+        examples=[None]
+    )
+    format: Literal["ndjson", "sse"] = Field(
+        default="ndjson",
+        description="Stream encoding: newline-delimited JSON or Server-Sent Events"
+    )
+
+
+class SnippetAnalysis(BaseModel):
+    """Analysis of one stored snippet in batch mode. Line numbers are relative to the snippet."""
+    snippet_index: int
+    status: str
+    issues: List[IssueDetail] = []
+    total_issues: int
+    cached: bool = False
+    error_message: Optional[str] = None
 
 
 class AnalyzeCodeResponse(BaseModel):
@@ -40,23 +80,111 @@ class AnalyzeCodeResponse(BaseModel):
     status: str
     issues: List[IssueDetail] = []
     total_issues: int
+    cached: bool = False
+    model: Optional[str] = None
+    estimated_input_tokens: Optional[int] = None
+    truncated_output: bool = False
+    reused_definitions: Optional[int] = None
+    analyzed_definitions: Optional[int] = None
+    failed_chunks: Optional[int] = None
+    snippets: Optional[List[SnippetAnalysis]] = None
     error_message: Optional[str] = None
 
 
+def _format_issues(issues: list) -> List[IssueDetail]:
+    """Convert raw issues from the service into IssueDetail models, skipping malformed ones."""
+    formatted_issues = []
+    for issue in issues:
+        try:
+            formatted_issues.append(IssueDetail(
+                title=issue.get("title", ""),
+                type=issue.get("type", ""),
+                severity=issue.get("severity", ""),
+                lineNumber=issue.get("lineNumber"),
+                description=issue.get("description", ""),
+                suggestedFix=issue.get("suggestedFix", "")
+            ))
+        except Exception:
+            # Skip malformed issues
+            pass
+    return formatted_issues
+
+
+async def _analyze_batch(snippets: List[str], api_key: Optional[str], incremental: bool = False,
+                         compress: Optional[bool] = None, latency_budget: Optional[float] = None) -> AnalyzeCodeResponse:
+    """
+    Analyze each snippet as its own upstream call and aggregate the results.
+    The aggregate issues carry line numbers of the joined stored code, like a non-batch analysis.
+    """
+    results = await map_snippets(snippets, lambda snippet: analyze_code_service(
+        snippet, api_key=api_key, incremental=incremental, compress=compress, latency_budget=latency_budget
+    ))
+    if all(isinstance(result, Exception) for result in results):
+        # Nothing succeeded - surface the failure like a single request would
+        raise results[0]
+
+    snippet_results = []
+    for index, result in enumerate(results):
+        if not isinstance(result, dict):
+            snippet_results.append(SnippetAnalysis(
+                snippet_index=index,
+                status="error",
+                total_issues=0,
+                error_message=str(result) if isinstance(result, Exception) else "Unexpected response format from AI service"
+            ))
+            continue
+        issues = _format_issues(result.get("issues", []))
+        snippet_results.append(SnippetAnalysis(
+            snippet_index=index,
+            status="success",
+            issues=issues,
+            total_issues=len(issues),
+            cached=result.get("cached", False)
+        ))
+
+    succeeded = [r for r in snippet_results if r.status == "success"]
+    failed = len(snippet_results) - len(succeeded)
+    offsets = snippet_line_offsets(snippets)
+    all_issues = [
+        issue.model_copy(update={"lineNumber": issue.lineNumber + offsets[r.snippet_index]})
+        if issue.lineNumber is not None else issue
+        for r in succeeded for issue in r.issues
+    ]
+    return AnalyzeCodeResponse(
+        status="success",
+        issues=all_issues,
+        total_issues=len(all_issues),
+        cached=all(r.cached for r in succeeded),
+        snippets=snippet_results,
+        error_message=f"{failed} of {len(snippet_results)} snippets failed" if failed else None
+    )
+
+
 @router.post(
     "/analyze-code",
     response_model=AnalyzeCodeResponse,
     summary="Analyze Code for Issues",
     description="Analyze code snippets for potential bugs, security risks, and best practices.",
 )
-def analyze_code_endpoint(request: AnalyzeCodeRequest):
+async def analyze_code_endpoint(request: AnalyzeCodeRequest, response: Response):
     """
     Analyze code for potential issues.
     
     - **code**: Optional code snippet. If not provided, analyzes code from /code-input endpoint
     - **api_key**: Optional Gemini API key. If not provided, uses API_KEY from environment variables
+    - **batch**: Analyze stored snippets independently and in parallel instead of as one joined prompt
+    - **incremental**: Re-analyze only top-level definitions that changed since an earlier request
+    - **compress**: Send the code to the model without comments, docstrings and blank lines
+    - **latency_budget**: Seconds the client is willing to wait; small budgets use the fast model tier
     """
     try:
+        if request.batch and not request.code:
+            snippets = get_stored_snippets()
+            if snippets:
+                return await _analyze_batch(
+                    snippets, request.api_key, request.incremental, request.compress, request.latency_budget
+                )
+
         # Get code to analyze
         code_to_analyze = request.code if request.code else get_stored_code()
         
@@ -69,7 +197,10 @@ def analyze_code_endpoint(request: AnalyzeCodeRequest):
             )
         
         # Analyze code
-        result = analyze_code_service(code_to_analyze, api_key=request.api_key)
+        result = await analyze_code_service(
+            code_to_analyze, api_key=request.api_key, incremental=request.incremental, compress=request.compress,
+            latency_budget=request.latency_budget
+        )
         
         if not isinstance(result, dict):
             return AnalyzeCodeResponse(
@@ -79,28 +210,44 @@ def analyze_code_endpoint(request: AnalyzeCodeRequest):
                 error_message="Unexpected response format from AI service"
             )
         
-        issues = result.get("issues", [])
-        
         # Convert to response format
-        formatted_issues = []
-        for issue in issues:
-            try:
-                formatted_issues.append(IssueDetail(
-                    title=issue.get("title", ""),
-                    type=issue.get("type", ""),
-                    severity=issue.get("severity", ""),
-                    lineNumber=issue.get("lineNumber"),
-                    description=issue.get("description", ""),
-                    suggestedFix=issue.get("suggestedFix", "")
-                ))
-            except Exception:
-                # Skip malformed issues
-                pass
+        formatted_issues = _format_issues(result.get("issues", []))
+        failed_chunks = result.get("failed_chunks")
         
         return AnalyzeCodeResponse(
             status="success",
             issues=formatted_issues,
-            total_issues=len(formatted_issues)
+            total_issues=len(formatted_issues),
+            cached=result.get("cached", False),
+            model=result.get("model"),
+            estimated_input_tokens=result.get("estimated_input_tokens"),
+            truncated_output=result.get("truncated_output", False),
+            reused_definitions=result.get("reused_definitions"),
+            analyzed_definitions=result.get("analyzed_definitions"),
+            failed_chunks=failed_chunks,
+            error_message=(
+                f"{failed_chunks} of {result.get('total_chunks')} chunks failed; their issues are missing"
+                if failed_chunks else None
+            )
+        )
+    except OverloadedError as e:
+        # Upstream capacity exhausted - tell the client when to retry
+        response.status_code = 429
+        response.headers["Retry-After"] = str(e.retry_after)
+        return AnalyzeCodeResponse(
+            status="error",
+            issues=[],
+            total_issues=0,
+            error_message=str(e)
+        )
+    except TokenBudgetError as e:
+        # Prompt estimated above MAX_INPUT_TOKENS - rejected before calling the model
+        response.status_code = 413
+        return AnalyzeCodeResponse(
+            status="error",
+            issues=[],
+            total_issues=0,
+            error_message=str(e)
         )
     except ValueError as e:
         # API key validation or other ValueError
@@ -123,3 +270,66 @@ def analyze_code_endpoint(request: AnalyzeCodeRequest):
             total_issues=0,
             error_message=error_msg
         )
+
+
+def _encode_event(event: str, data: dict, stream_format: str) -> str:
+    """Encode one stream event as an NDJSON line or an SSE message."""
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+
+@router.post(
+    "/analyze-code/stream",
+    response_class=StreamingResponse,
+    summary="Stream Code Analysis",
+    description="Analyze code and stream each issue as soon as the model has produced it.",
+)
+async def analyze_code_stream_endpoint(request: AnalyzeCodeStreamRequest):
+    """
+    Analyze code for potential issues, streaming results.
+    
+    Emits an `issue` event per IssueDetail, then a `done` event with `total_issues`
+    and `cached`, or an `error` event with `error_message`.
+    
+    - **code**: Optional code snippet. If not provided, analyzes code from /code-input endpoint
+    - **api_key**: Optional Gemini API key. If not provided, uses API_KEY from environment variables
+    - **format**: "ndjson" (default) or "sse"
+    """
+    code_to_analyze = request.code if request.code else get_stored_code()
+
+    async def _events():
+        if not code_to_analyze:
+            yield _encode_event("error", {
+                "error_message": "No code provided. Please provide code in request or load code using /code-input endpoint"
+            }, request.format)
+            return
+
+        total_issues = 0
+        try:
+            async for event, payload in stream_analyze_code_service(code_to_analyze, api_key=request.api_key):
+                if event == "issue":
+                    for issue in _format_issues([payload]):
+                        total_issues += 1
+                        yield _encode_event("issue", issue.model_dump(), request.format)
+                else:
+                    yield _encode_event("done", {
+                        "status": "success",
+                        "total_issues": total_issues,
+                        "cached": payload.get("cached", False)
+                    }, request.format)
+        except OverloadedError as e:
+            yield _encode_event("error", {"error_message": str(e), "retry_after": e.retry_after}, request.format)
+        except ValueError as e:
+            # API key validation or other ValueError
+            print(f"API Key/Validation Error: {str(e)}")
+            yield _encode_event("error", {"error_message": str(e)}, request.format)
+        except Exception as e:
+            import traceback
+            error_msg = f"Error analyzing code: {str(e)}"
+            print(error_msg)
+            traceback.print_exc()
+            yield _encode_event("error", {"error_message": error_msg}, request.format)
+
+    media_type = "text/event-stream" if request.format == "sse" else "application/x-ndjson"
+    return StreamingResponse(_events(), media_type=media_type)
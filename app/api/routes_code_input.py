@@ -12,6 +12,9 @@ router = APIRouter()
 # Global storage for code snippets
 _code_storage: List[str] = []
 
+# Placed between snippets when they are analyzed as one piece of code
+SNIPPET_SEPARATOR = "\n\n---SNIPPET SEPARATOR---\n\n"
+
 
 class CodeInputRequest(BaseModel):
     """Request model for loading code snippets."""
@@ -63,7 +66,23 @@ def code_input_endpoint(request: CodeInputRequest):
 def get_stored_code() -> str:
     """Get all stored code snippets joined together."""
     global _code_storage
-    return "\n\n---SNIPPET SEPARATOR---\n\n".join(_code_storage) if _code_storage else ""
+    return SNIPPET_SEPARATOR.join(_code_storage) if _code_storage else ""
+
+
+def snippet_line_offsets(snippets: List[str]) -> List[int]:
+    """Lines before each snippet when the snippets are joined with SNIPPET_SEPARATOR."""
+    offsets = []
+    offset = 0
+    for snippet in snippets:
+        offsets.append(offset)
+        offset += snippet.count("\n") + SNIPPET_SEPARATOR.count("\n")
+    return offsets
+
+
+def get_stored_snippets() -> List[str]:
+    """Get a copy of the stored code snippets, one entry per snippet."""
+    global _code_storage
+    return list(_code_storage)
 
 
 def clear_stored_code():
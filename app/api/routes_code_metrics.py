@@ -1,13 +1,17 @@
 """
 Routes for code metrics endpoint.
-Calculates code quality metrics and issue distribution using Gemini API.
+Calculates code quality metrics and issue distribution using Gemini API,
+and static metrics computed locally.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from pydantic import BaseModel, Field
-from typing import Optional
-from app.services import get_code_metrics as get_code_metrics_service
-from app.api.routes_code_input import get_stored_code
+from typing import Dict, List, Literal, Optional
+from app.services import get_code_metrics as get_code_metrics_service, map_snippets
+from app.api.routes_code_input import get_stored_code, get_stored_snippets
+from app.scheduler import OverloadedError
+from app.schemas import IssueDistribution, SummaryMetrics
+from app.tokens import TokenBudgetError
 
 router = APIRouter()
 
@@ -23,46 +27,227 @@ class MetricsRequest(BaseModel):
         description="Gemini API key. If not provided, uses API_KEY from environment variables.",
         examples=[None]
     )
+    batch: bool = Field(
+        default=False,
+        description="Compute metrics for each snippet stored via /code-input as an independent call. Ignored when code is provided."
+    )
+    mode: Literal["llm", "local", "hybrid"] = Field(
+        default="llm",
+        description="'llm': Gemini metrics only. 'local': static metrics only, no model call. 'hybrid': both."
+    )
+    compress: Optional[bool] = Field(
+        default=None,
+        description="Strip comments, docstrings and blank lines before prompting. Defaults to the server setting."
+    )
+    latency_budget: Optional[float] = Field(
+        default=None,
+        description="Seconds the client is willing to wait. Small budgets route the request to the fast model tier.",
+        gt=0
+    )
+
+
+class LineCounts(BaseModel):
+    """Model for line counts."""
+    total: int
+    source: int
+    comment: int
+    blank: int
+
 
+class ComplexitySummary(BaseModel):
+    """Model for cyclomatic complexity over the whole code."""
+    total: int
+    average: float
+    max: int
 
-class SummaryMetrics(BaseModel):
-    """Model for code quality metrics."""
-    code_quality_score: int
-    security_rating: int
-    bug_density: int
-    critical_issue_count: int
 
+class HalsteadMetrics(BaseModel):
+    """Model for Halstead measures."""
+    distinct_operators: int
+    distinct_operands: int
+    total_operators: int
+    total_operands: int
+    vocabulary: int
+    length: int
+    volume: float
+    difficulty: float
+    effort: float
+    estimated_bugs: float
 
-class IssueDistribution(BaseModel):
-    """Model for issue distribution."""
-    security_vulnerabilities: int
-    code_smells: int
-    best_practices: int
-    performance_issues: int
+
+class FunctionLengthDistribution(BaseModel):
+    """Model for the distribution of function lengths in lines."""
+    count: int
+    min: int
+    max: int
+    mean: float
+    median: float
+    buckets: Dict[str, int]
+
+
+class FunctionMetrics(BaseModel):
+    """Model for metrics of a single function or method."""
+    name: str
+    line_number: int
+    length: int
+    cyclomatic_complexity: int
+    max_nesting_depth: int
+
+
+class StaticMetrics(BaseModel):
+    """Model for locally computed metrics. Parse-dependent fields are null when syntax_error is set."""
+    lines: LineCounts
+    cyclomatic_complexity: Optional[ComplexitySummary] = None
+    max_nesting_depth: Optional[int] = None
+    halstead: Optional[HalsteadMetrics] = None
+    function_lengths: Optional[FunctionLengthDistribution] = None
+    functions: Optional[List[FunctionMetrics]] = None
+    maintainability_index: Optional[float] = None
+    syntax_error: Optional[str] = None
+
+
+class SnippetMetrics(BaseModel):
+    """Metrics of one stored snippet in batch mode."""
+    snippet_index: int
+    status: str
+    summary_metrics: Optional[SummaryMetrics] = None
+    issue_distribution: Optional[IssueDistribution] = None
+    static_metrics: Optional[StaticMetrics] = None
+    cached: bool = False
+    error_message: Optional[str] = None
 
 
 class MetricsResponse(BaseModel):
-    """Response model for code metrics."""
+    """Response model for code metrics. summary_metrics and issue_distribution are null in local mode."""
     status: str
-    summary_metrics: SummaryMetrics
-    issue_distribution: IssueDistribution
+    summary_metrics: Optional[SummaryMetrics] = None
+    issue_distribution: Optional[IssueDistribution] = None
+    static_metrics: Optional[StaticMetrics] = None
+    cached: bool = False
+    model: Optional[str] = None
+    estimated_input_tokens: Optional[int] = None
+    derived_from_analysis: bool = False
+    snippets: Optional[List[SnippetMetrics]] = None
     error_message: Optional[str] = None
 
 
+def _build_summary_metrics(summary_metrics: Optional[dict]) -> Optional[SummaryMetrics]:
+    """Convert raw summary metrics from the service into a SummaryMetrics model."""
+    if summary_metrics is None:
+        return None
+    return SummaryMetrics(
+        code_quality_score=summary_metrics.get("code_quality_score", 0),
+        security_rating=summary_metrics.get("security_rating", 0),
+        bug_density=summary_metrics.get("bug_density", 0),
+        critical_issue_count=summary_metrics.get("critical_issue_count", 0)
+    )
+
+
+def _build_issue_distribution(issue_distribution: Optional[dict]) -> Optional[IssueDistribution]:
+    """Convert a raw issue distribution from the service into an IssueDistribution model."""
+    if issue_distribution is None:
+        return None
+    return IssueDistribution(
+        security_vulnerabilities=issue_distribution.get("security_vulnerabilities", 0),
+        code_smells=issue_distribution.get("code_smells", 0),
+        best_practices=issue_distribution.get("best_practices", 0),
+        performance_issues=issue_distribution.get("performance_issues", 0)
+    )
+
+
+def _build_static_metrics(static_metrics: Optional[dict]) -> Optional[StaticMetrics]:
+    """Convert locally computed metrics into a StaticMetrics model."""
+    if static_metrics is None:
+        return None
+    return StaticMetrics(**static_metrics)
+
+
+async def _metrics_batch(snippets: List[str], api_key: Optional[str], mode: str = "llm",
+                         compress: Optional[bool] = None, latency_budget: Optional[float] = None) -> MetricsResponse:
+    """
+    Compute metrics for each snippet as its own upstream call and aggregate them.
+    Scores are averaged over the successful snippets; counts are summed.
+    Static metrics are only reported per snippet.
+    """
+    results = await map_snippets(snippets, lambda snippet: get_code_metrics_service(
+        snippet, api_key=api_key, mode=mode, compress=compress, latency_budget=latency_budget
+    ))
+    if all(isinstance(result, Exception) for result in results):
+        # Nothing succeeded - surface the failure like a single request would
+        raise results[0]
+
+    snippet_results = []
+    for index, result in enumerate(results):
+        if not isinstance(result, dict):
+            snippet_results.append(SnippetMetrics(
+                snippet_index=index,
+                status="error",
+                error_message=str(result) if isinstance(result, Exception) else "Unexpected response format from AI service"
+            ))
+            continue
+        snippet_results.append(SnippetMetrics(
+            snippet_index=index,
+            status="success",
+            summary_metrics=_build_summary_metrics(result.get("summary_metrics", {} if mode != "local" else None)),
+            issue_distribution=_build_issue_distribution(result.get("issue_distribution", {} if mode != "local" else None)),
+            static_metrics=_build_static_metrics(result.get("static_metrics")),
+            cached=result.get("cached", False)
+        ))
+
+    succeeded = [r for r in snippet_results if r.status == "success"]
+    failed = len(snippet_results) - len(succeeded)
+    count = max(len(succeeded), 1)
+    if mode == "local":
+        return MetricsResponse(
+            status="success",
+            snippets=snippet_results,
+            error_message=f"{failed} of {len(snippet_results)} snippets failed" if failed else None
+        )
+    return MetricsResponse(
+        status="success",
+        summary_metrics=SummaryMetrics(
+            code_quality_score=round(sum(r.summary_metrics.code_quality_score for r in succeeded) / count),
+            security_rating=round(sum(r.summary_metrics.security_rating for r in succeeded) / count),
+            bug_density=sum(r.summary_metrics.bug_density for r in succeeded),
+            critical_issue_count=sum(r.summary_metrics.critical_issue_count for r in succeeded)
+        ),
+        issue_distribution=IssueDistribution(
+            security_vulnerabilities=sum(r.issue_distribution.security_vulnerabilities for r in succeeded),
+            code_smells=sum(r.issue_distribution.code_smells for r in succeeded),
+            best_practices=sum(r.issue_distribution.best_practices for r in succeeded),
+            performance_issues=sum(r.issue_distribution.performance_issues for r in succeeded)
+        ),
+        cached=all(r.cached for r in succeeded),
+        snippets=snippet_results,
+        error_message=f"{failed} of {len(snippet_results)} snippets failed" if failed else None
+    )
+
+
 @router.post(
     "/code-metrics",
     response_model=MetricsResponse,
     summary="Calculate Code Metrics",
     description="Calculate code quality metrics and issue distribution for code.",
 )
-def code_metrics_endpoint(request: MetricsRequest):
+async def code_metrics_endpoint(request: MetricsRequest, response: Response):
     """
     Get code quality metrics and issue distribution.
     
     - **code**: Optional code snippet. If not provided, analyzes code from /code-input endpoint
     - **api_key**: Optional Gemini API key. If not provided, uses API_KEY from environment variables
+    - **batch**: Compute metrics for stored snippets independently and in parallel instead of as one joined prompt
+    - **mode**: "llm" (default), "local" (static metrics only, no model call) or "hybrid"
+    - **compress**: Send the code to the model without comments, docstrings and blank lines
+    - **latency_budget**: Seconds the client is willing to wait; small budgets use the fast model tier
     """
     try:
+        if request.batch and not request.code:
+            snippets = get_stored_snippets()
+            if snippets:
+                return await _metrics_batch(
+                    snippets, request.api_key, request.mode, request.compress, request.latency_budget
+                )
+
         # Get code to analyze
         code_to_analyze = request.code if request.code else get_stored_code()
         
@@ -85,25 +270,64 @@ def code_metrics_endpoint(request: MetricsRequest):
             )
         
         # Get metrics
-        result = get_code_metrics_service(code_to_analyze, api_key=request.api_key)
-        
-        summary_metrics = result.get("summary_metrics", {})
-        issue_distribution = result.get("issue_distribution", {})
+        result = await get_code_metrics_service(
+            code_to_analyze, api_key=request.api_key, mode=request.mode, compress=request.compress,
+            latency_budget=request.latency_budget
+        )
         
+        if request.mode == "local":
+            return MetricsResponse(
+                status="success",
+                static_metrics=_build_static_metrics(result.get("static_metrics"))
+            )
         return MetricsResponse(
             status="success",
+            summary_metrics=_build_summary_metrics(result.get("summary_metrics", {})),
+            issue_distribution=_build_issue_distribution(result.get("issue_distribution", {})),
+            static_metrics=_build_static_metrics(result.get("static_metrics")),
+            cached=result.get("cached", False),
+            model=result.get("model"),
+            estimated_input_tokens=result.get("estimated_input_tokens"),
+            derived_from_analysis=result.get("derived_from_analysis", False)
+        )
+    except OverloadedError as e:
+        # Upstream capacity exhausted - tell the client when to retry
+        response.status_code = 429
+        response.headers["Retry-After"] = str(e.retry_after)
+        return MetricsResponse(
+            status="error",
             summary_metrics=SummaryMetrics(
-                code_quality_score=summary_metrics.get("code_quality_score", 0),
-                security_rating=summary_metrics.get("security_rating", 0),
-                bug_density=summary_metrics.get("bug_density", 0),
-                critical_issue_count=summary_metrics.get("critical_issue_count", 0)
+                code_quality_score=0,
+                security_rating=0,
+                bug_density=0,
+                critical_issue_count=0
             ),
             issue_distribution=IssueDistribution(
-                security_vulnerabilities=issue_distribution.get("security_vulnerabilities", 0),
-                code_smells=issue_distribution.get("code_smells", 0),
-                best_practices=issue_distribution.get("best_practices", 0),
-                performance_issues=issue_distribution.get("performance_issues", 0)
-            )
+                security_vulnerabilities=0,
+                code_smells=0,
+                best_practices=0,
+                performance_issues=0
+            ),
+            error_message=str(e)
+        )
+    except TokenBudgetError as e:
+        # Prompt estimated above MAX_INPUT_TOKENS - rejected before calling the model
+        response.status_code = 413
+        return MetricsResponse(
+            status="error",
+            summary_metrics=SummaryMetrics(
+                code_quality_score=0,
+                security_rating=0,
+                bug_density=0,
+                critical_issue_count=0
+            ),
+            issue_distribution=IssueDistribution(
+                security_vulnerabilities=0,
+                code_smells=0,
+                best_practices=0,
+                performance_issues=0
+            ),
+            error_message=str(e)
         )
     except ValueError as e:
         # API key validation or other ValueError
@@ -3,11 +3,18 @@ Routes for bug injection endpoint.
 Injects bugs into code snippets for testing using Gemini API.
 """
 
-from fastapi import APIRouter
+import json
+
+from fastapi import APIRouter, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
-from app.services import inject_bugs as inject_bugs_service
-from app.api.routes_code_input import get_stored_code
+from typing import List, Literal, Optional
+from app.dataset import generate_records, iter_tasks
+from app.services import inject_bugs as inject_bugs_service, map_snippets
+from app.api.routes_code_input import SNIPPET_SEPARATOR, get_stored_code, get_stored_snippets, snippet_line_offsets
+from app.scheduler import OverloadedError
+from app.schemas import BugDetail
+from app.tokens import TokenBudgetError
 
 router = APIRouter()
 
@@ -39,13 +46,90 @@ class InjectBugsRequest(BaseModel):
         description="Gemini API key. If not provided, uses API_KEY from environment variables.",
         examples=[None]
     )
+    batch: bool = Field(
+        default=False,
+        description="Inject bugs into each snippet stored via /code-input as an independent call. Ignored when code is provided."
+    )
+    output_mode: Literal["full", "edits"] = Field(
+        default="full",
+        description="'full': the model returns the whole modified code. 'edits': it returns only the changed lines, which are applied on the server (much faster for large files)."
+    )
+    latency_budget: Optional[float] = Field(
+        default=None,
+        description="Seconds the client is willing to wait. Small budgets route the request to the fast model tier.",
+        gt=0
+    )
+    variants: int = Field(
+        default=1,
+        description="Number of different buggy versions to generate. Several versions are requested in a single model call, sending the code once.",
+        ge=1,
+        le=10,
+    )
+    engine: Literal["auto", "local", "model"] = Field(
+        default="auto",
+        description="'auto': inject supported bug types (e.g. 'Division by Zero', 'Off-by-one', 'SQL Injection') locally with AST mutations, using Gemini otherwise. 'local': local mutation only. 'model': always use Gemini."
+    )
 
 
-class BugDetail(BaseModel):
-    """Model for individual injected bug."""
-    type: str
-    line_number: int
-    description: str
+class InjectBugsDatasetRequest(BaseModel):
+    """Request model for bulk dataset generation."""
+    snippets: Optional[List[str]] = Field(
+        default=None,
+        description="Code snippets to inject bugs into. If not provided, uses the snippets stored via /code-input"
+    )
+    bug_types: List[str] = Field(
+        description="Bug types to inject; every snippet gets one variant per bug type and severity level",
+        min_length=1,
+    )
+    severity_levels: List[Literal[1, 2, 3, 4, 5]] = Field(
+        default=[5],
+        description="Severity levels to inject at",
+        min_length=1,
+    )
+    num_bugs: int = Field(
+        default=2,
+        description="Number of bugs to inject per variant",
+        ge=1,
+        le=10,
+    )
+    max_parallel: Optional[int] = Field(
+        default=None,
+        description="Variants generated concurrently. Defaults to BATCH_MAX_PARALLEL.",
+        ge=1,
+        le=32,
+    )
+    api_key: Optional[str] = Field(
+        default=None,
+        description="Gemini API key. If not provided, uses API_KEY from environment variables.",
+        examples=[None]
+    )
+    engine: Literal["auto", "local", "model"] = Field(
+        default="auto",
+        description="See InjectBugsRequest.engine"
+    )
+    output_mode: Literal["full", "edits"] = Field(
+        default="full",
+        description="See InjectBugsRequest.output_mode"
+    )
+
+
+class BugInjectionVariant(BaseModel):
+    """One buggy version of the code when several variants are requested."""
+    buggy_code: str
+    bugs_injected: List[BugDetail] = []
+    total_bugs_injected: int
+
+
+class SnippetBugInjection(BaseModel):
+    """Bug injection result for one stored snippet in batch mode. Line numbers are relative to the snippet."""
+    snippet_index: int
+    status: str
+    buggy_code: str
+    bugs_injected: List[BugDetail] = []
+    total_bugs_injected: int
+    variants: Optional[List[BugInjectionVariant]] = None
+    cached: bool = False
+    error_message: Optional[str] = None
 
 
 class InjectBugsResponse(BaseModel):
@@ -54,16 +138,117 @@ class InjectBugsResponse(BaseModel):
     buggy_code: str
     bugs_injected: List[BugDetail] = []
     total_bugs_injected: int
+    cached: bool = False
+    model: Optional[str] = None
+    engine: Optional[str] = None
+    estimated_input_tokens: Optional[int] = None
+    truncated_output: bool = False
+    skipped_edits: Optional[int] = None
+    variants: Optional[List[BugInjectionVariant]] = None
+    rejected_variants: Optional[int] = None
+    snippets: Optional[List[SnippetBugInjection]] = None
     error_message: Optional[str] = None
 
 
+def _format_bugs(bugs_injected: list) -> List[BugDetail]:
+    """Convert raw injected bugs from the service into BugDetail models, skipping malformed ones."""
+    formatted_bugs = []
+    for bug in bugs_injected:
+        try:
+            formatted_bugs.append(BugDetail(
+                type=bug.get("type", ""),
+                line_number=bug.get("line_number", 0),
+                description=bug.get("description", "")
+            ))
+        except Exception:
+            # Skip malformed bugs
+            pass
+    return formatted_bugs
+
+
+def _format_variants(variants: Optional[list]) -> Optional[List[BugInjectionVariant]]:
+    """Convert the service's variants into BugInjectionVariant models (None when variants were not requested)."""
+    if variants is None:
+        return None
+    formatted_variants = []
+    for variant in variants:
+        bugs = _format_bugs(variant.get("bugs_injected", []))
+        formatted_variants.append(BugInjectionVariant(
+            buggy_code=variant.get("buggy_code", ""),
+            bugs_injected=bugs,
+            total_bugs_injected=len(bugs)
+        ))
+    return formatted_variants
+
+
+async def _inject_batch(snippets: List[str], request: InjectBugsRequest) -> InjectBugsResponse:
+    """
+    Inject bugs into each snippet as its own upstream call and aggregate the results.
+    The aggregate buggy_code joins the per-snippet results like stored code is joined,
+    and the aggregate bugs carry line numbers of that joined code.
+    """
+    results = await map_snippets(snippets, lambda snippet: inject_bugs_service(
+        code_snippet=snippet,
+        bug_type=request.bug_type,
+        severity_level=request.severity_level,
+        num_bugs=request.num_bugs,
+        api_key=request.api_key,
+        latency_budget=request.latency_budget,
+        output_mode=request.output_mode,
+        engine=request.engine,
+        variants=request.variants
+    ))
+    if all(isinstance(result, Exception) for result in results):
+        # Nothing succeeded - surface the failure like a single request would
+        raise results[0]
+
+    snippet_results = []
+    for index, result in enumerate(results):
+        if not isinstance(result, dict):
+            snippet_results.append(SnippetBugInjection(
+                snippet_index=index,
+                status="error",
+                buggy_code=snippets[index],
+                total_bugs_injected=0,
+                error_message=str(result) if isinstance(result, Exception) else "Unexpected response format from AI service"
+            ))
+            continue
+        bugs = _format_bugs(result.get("bugs_injected", []))
+        snippet_results.append(SnippetBugInjection(
+            snippet_index=index,
+            status="success",
+            buggy_code=result.get("buggy_code", ""),
+            bugs_injected=bugs,
+            total_bugs_injected=len(bugs),
+            variants=_format_variants(result.get("variants")),
+            cached=result.get("cached", False)
+        ))
+
+    succeeded = [r for r in snippet_results if r.status == "success"]
+    failed = len(snippet_results) - len(succeeded)
+    offsets = snippet_line_offsets([r.buggy_code for r in snippet_results])
+    all_bugs = [
+        bug.model_copy(update={"line_number": bug.line_number + offsets[r.snippet_index]})
+        for r in succeeded for bug in r.bugs_injected
+    ]
+    return InjectBugsResponse(
+        status="success",
+        buggy_code=SNIPPET_SEPARATOR.join(r.buggy_code for r in snippet_results),
+        bugs_injected=all_bugs,
+        total_bugs_injected=len(all_bugs),
+        cached=all(r.cached for r in succeeded),
+        snippets=snippet_results,
+        error_message=f"{failed} of {len(snippet_results)} snippets failed" if failed else None
+    )
+
+
 @router.post(
     "/inject-bugs",
     response_model=InjectBugsResponse,
     summary="Inject Bugs into Code",
     description="Inject specified bugs into code for testing and training purposes.",
 )
-def inject_bugs_endpoint(request: InjectBugsRequest):
+async def inject_bugs_endpoint(request: InjectBugsRequest, response: Response):
     """
     Inject bugs into code snippets.
     
@@ -72,8 +257,18 @@ def inject_bugs_endpoint(request: InjectBugsRequest):
     - **severity_level**: 1-5 where 5 is most severe (default: 5)
     - **num_bugs**: Number of bugs to inject (default: 2)
     - **api_key**: Optional Gemini API key. If not provided, uses API_KEY from environment variables
+    - **batch**: Inject into stored snippets independently and in parallel instead of as one joined prompt
+    - **output_mode**: "full" (default) or "edits" to have the model return only the changed lines
+    - **latency_budget**: Seconds the client is willing to wait; small budgets use the fast model tier
+    - **engine**: "auto" (default), "local" or "model"; see InjectBugsRequest.engine
+    - **variants**: Number of different buggy versions (default: 1), generated in one model call
     """
     try:
+        if request.batch and not request.code:
+            snippets = get_stored_snippets()
+            if snippets:
+                return await _inject_batch(snippets, request)
+
         # Get code to analyze
         code_to_analyze = request.code if request.code else get_stored_code()
         
@@ -87,35 +282,57 @@ def inject_bugs_endpoint(request: InjectBugsRequest):
             )
         
         # Inject bugs
-        result = inject_bugs_service(
+        result = await inject_bugs_service(
             code_snippet=code_to_analyze,
             bug_type=request.bug_type,
             severity_level=request.severity_level,
             num_bugs=request.num_bugs,
-            api_key=request.api_key
+            api_key=request.api_key,
+            latency_budget=request.latency_budget,
+            output_mode=request.output_mode,
+            engine=request.engine,
+            variants=request.variants
         )
         
         buggy_code = result.get("buggy_code", "")
-        bugs_injected = result.get("bugs_injected", [])
         
         # Convert to response format
-        formatted_bugs = []
-        for bug in bugs_injected:
-            try:
-                formatted_bugs.append(BugDetail(
-                    type=bug.get("type", ""),
-                    line_number=bug.get("line_number", 0),
-                    description=bug.get("description", "")
-                ))
-            except Exception:
-                # Skip malformed bugs
-                pass
+        formatted_bugs = _format_bugs(result.get("bugs_injected", []))
         
         return InjectBugsResponse(
             status="success",
             buggy_code=buggy_code,
             bugs_injected=formatted_bugs,
-            total_bugs_injected=len(formatted_bugs)
+            total_bugs_injected=len(formatted_bugs),
+            cached=result.get("cached", False),
+            model=result.get("model"),
+            engine=result.get("engine"),
+            estimated_input_tokens=result.get("estimated_input_tokens"),
+            truncated_output=result.get("truncated_output", False),
+            skipped_edits=result.get("skipped_edits"),
+            variants=_format_variants(result.get("variants")),
+            rejected_variants=result.get("rejected_variants")
+        )
+    except OverloadedError as e:
+        # Upstream capacity exhausted - tell the client when to retry
+        response.status_code = 429
+        response.headers["Retry-After"] = str(e.retry_after)
+        return InjectBugsResponse(
+            status="error",
+            buggy_code="",
+            bugs_injected=[],
+            total_bugs_injected=0,
+            error_message=str(e)
+        )
+    except TokenBudgetError as e:
+        # Prompt estimated above MAX_INPUT_TOKENS - rejected before calling the model
+        response.status_code = 413
+        return InjectBugsResponse(
+            status="error",
+            buggy_code="",
+            bugs_injected=[],
+            total_bugs_injected=0,
+            error_message=str(e)
         )
     except ValueError as e:
         # API key validation or other ValueError
@@ -140,3 +357,53 @@ def inject_bugs_endpoint(request: InjectBugsRequest):
             total_bugs_injected=0,
             error_message=error_msg
         )
+
+
+@router.post(
+    "/inject-bugs/dataset",
+    response_class=StreamingResponse,
+    summary="Generate Bug Injection Dataset",
+    description="Inject bugs into many snippets for every bug type and severity level, streaming one JSON line per variant.",
+)
+async def inject_bugs_dataset_endpoint(request: InjectBugsDatasetRequest):
+    """
+    Generate a bug injection dataset, streamed as JSONL.
+
+    Emits one line per snippet x bug type x severity level as soon as it is done,
+    with `status` "ok" (a new variant with `original_code`, `buggy_code` and
+    `bugs_injected`), "duplicate" (same buggy code as an earlier line) or
+    "failed" (with `error_message`). Snippets are identified by `snippet_id`,
+    their index in the request. For resumable runs over files use `python -m app.dataset`.
+
+    - **snippets**: Optional snippets. If not provided, uses the snippets stored via /code-input
+    - **bug_types**: Bug types to inject
+    - **severity_levels**: Severity levels to inject at (default: [5])
+    - **num_bugs**: Bugs per variant (default: 2)
+    - **max_parallel**: Variants generated concurrently
+    - **api_key**, **engine**, **output_mode**: As for /inject-bugs
+    """
+    snippets = request.snippets if request.snippets else get_stored_snippets()
+
+    async def _lines():
+        if not snippets:
+            yield json.dumps({
+                "status": "error",
+                "error_message": "No code provided. Please provide snippets in request or load code using /code-input endpoint"
+            }) + "\n"
+            return
+        tasks = iter_tasks(
+            ((str(index), snippet) for index, snippet in enumerate(snippets)),
+            request.bug_types, request.severity_levels,
+            num_bugs=request.num_bugs, engine=request.engine, output_mode=request.output_mode
+        )
+        try:
+            async for record in generate_records(tasks, max_parallel=request.max_parallel, api_key=request.api_key):
+                yield json.dumps(record) + "\n"
+        except Exception as e:
+            import traceback
+            error_msg = f"Error generating dataset: {str(e)}"
+            print(error_msg)
+            traceback.print_exc()
+            yield json.dumps({"status": "error", "error_message": error_msg}) + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
@@ -0,0 +1,138 @@
+"""
+Routes for asynchronous jobs.
+Submit analysis, metrics, bug injection or report work and poll for the result.
+"""
+
+import os
+from fastapi import APIRouter, Query, Response
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, Dict, Literal, Optional
+from app.jobs import JobFailed, JobManager
+from app.scheduler import OverloadedError
+from app.api.routes_analyze_code import AnalyzeCodeRequest, analyze_code_endpoint
+from app.api.routes_code_metrics import MetricsRequest, code_metrics_endpoint
+from app.api.routes_inject_bugs import InjectBugsRequest, inject_bugs_endpoint
+from app.api.routes_report import ReportRequest, report_endpoint
+
+router = APIRouter()
+
+# Background worker pool and bounded job store
+job_manager = JobManager(
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", "100")),
+    max_jobs=int(os.getenv("JOB_STORE_MAX", "1000")),
+    ttl_seconds=float(os.getenv("JOB_TTL_SECONDS", "3600")),
+)
+
+# Job kind -> (request model, endpoint that performs the work)
+_JOB_HANDLERS = {
+    "analyze": (AnalyzeCodeRequest, analyze_code_endpoint),
+    "metrics": (MetricsRequest, code_metrics_endpoint),
+    "inject": (InjectBugsRequest, inject_bugs_endpoint),
+    "report": (ReportRequest, report_endpoint),
+}
+
+
+class JobSubmitRequest(BaseModel):
+    """Request model for submitting a job."""
+    kind: Literal["analyze", "metrics", "inject", "report"] = Field(
+        ...,
+        description="Work to perform: 'analyze' (/analyze-code), 'metrics' (/code-metrics), 'inject' (/inject-bugs) or 'report' (/report)"
+    )
+    params: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Request body of the corresponding endpoint"
+    )
+
+
+class JobResponse(BaseModel):
+    """Response model for job submission and status."""
+    status: str
+    job_id: Optional[str] = None
+    kind: Optional[str] = None
+    job_status: Optional[str] = None
+    created_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    retry_after: Optional[int] = None
+    error_message: Optional[str] = None
+
+
+def _job_response(job) -> JobResponse:
+    return JobResponse(
+        status="success",
+        job_id=job.id,
+        kind=job.kind,
+        job_status=job.status,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+        result=job.result,
+        retry_after=job.retry_after,
+        error_message=job.error
+    )
+
+
+@router.post(
+    "/jobs",
+    response_model=JobResponse,
+    summary="Submit Job",
+    description="Queue an analysis, metrics or bug injection request and return a job id immediately.",
+)
+async def submit_job_endpoint(request: JobSubmitRequest, response: Response):
+    """
+    Submit work for background execution.
+
+    - **kind**: "analyze", "metrics", "inject" or "report"
+    - **params**: Same body as /analyze-code, /code-metrics, /inject-bugs or /report
+    """
+    request_model, endpoint = _JOB_HANDLERS[request.kind]
+    try:
+        job_request = request_model(**request.params)
+    except ValidationError as e:
+        return JobResponse(status="error", kind=request.kind, error_message=f"Invalid params: {str(e)}")
+
+    async def _run():
+        endpoint_response = Response()
+        result = await endpoint(job_request, endpoint_response)
+        if result.status == "error":
+            # The endpoint reports failures in its body (and 429/413 in the status code)
+            retry_after = endpoint_response.headers.get("Retry-After")
+            message = result.error_message or "Request failed"
+            if retry_after:
+                message = f"{message} Retry the job after {retry_after} seconds."
+            raise JobFailed(message, result=result.model_dump(), retry_after=int(retry_after) if retry_after else None)
+        return result.model_dump()
+
+    try:
+        job = job_manager.submit(request.kind, _run)
+    except OverloadedError as e:
+        response.status_code = 429
+        response.headers["Retry-After"] = str(e.retry_after)
+        return JobResponse(status="error", kind=request.kind, error_message=str(e))
+
+    response.status_code = 202
+    return _job_response(job)
+
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobResponse,
+    summary="Get Job Status",
+    description="Get a job's status and result. Set wait to long-poll until it finishes.",
+)
+async def get_job_endpoint(
+    job_id: str,
+    response: Response,
+    wait: float = Query(default=0, ge=0, le=60, description="Seconds to wait for the job to finish before returning"),
+):
+    """
+    Poll a job.
+
+    - **job_id**: Id returned by POST /jobs
+    - **wait**: Optional long-poll timeout in seconds (0-60)
+    """
+    job = await job_manager.wait(job_id, wait)
+    if job is None:
+        response.status_code = 404
+        return JobResponse(status="error", job_id=job_id, error_message="Job not found or expired")
+    return _job_response(job)
@@ -0,0 +1,157 @@
+"""
+Routes for the combined report endpoint.
+Returns analysis issues, code metrics and optionally injected bugs from a
+single Gemini call.
+"""
+
+from fastapi import APIRouter, Response
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from app.services import generate_report as generate_report_service
+from app.api.routes_code_input import get_stored_code
+from app.api.routes_analyze_code import _format_issues
+from app.api.routes_code_metrics import _build_issue_distribution, _build_summary_metrics
+from app.api.routes_inject_bugs import _format_bugs
+from app.scheduler import OverloadedError
+from app.schemas import BugDetail, IssueDetail, IssueDistribution, SummaryMetrics
+from app.tokens import TokenBudgetError
+
+router = APIRouter()
+
+
+class ReportRequest(BaseModel):
+    """Request model for the combined report."""
+    code: Optional[str] = Field(
+        default=None,
+        description="Code snippet to review. If not provided, uses stored code from /code-input"
+    )
+    api_key: Optional[str] = Field(
+        default=None,
+        description="Gemini API key. If not provided, uses API_KEY from environment variables.",
+        examples=[None]
+    )
+    include_injection: bool = Field(
+        default=False,
+        description="Also return a bug-injected variant of the code"
+    )
+    bug_type: str = Field(
+        default="Security Vulnerability",
+        description="Type of bug to inject when include_injection is set",
+    )
+    severity_level: int = Field(
+        default=5,
+        description="Severity level of injected bugs (1=Low, 2=Medium, 3=High, 4=Critical, 5=Extreme)",
+        ge=1,
+        le=5,
+    )
+    num_bugs: int = Field(
+        default=2,
+        description="Number of bugs to inject",
+        ge=1,
+        le=10,
+    )
+
+
+class ReportInjection(BaseModel):
+    """Model for the bug-injected variant of the code."""
+    buggy_code: str
+    bugs_injected: List[BugDetail] = []
+    total_bugs_injected: int
+
+
+class ReportResponse(BaseModel):
+    """Response model for the combined report."""
+    status: str
+    issues: List[IssueDetail] = []
+    total_issues: int
+    summary_metrics: Optional[SummaryMetrics] = None
+    issue_distribution: Optional[IssueDistribution] = None
+    injection: Optional[ReportInjection] = None
+    cached: bool = False
+    estimated_input_tokens: Optional[int] = None
+    truncated_output: bool = False
+    error_message: Optional[str] = None
+
+
+@router.post(
+    "/report",
+    response_model=ReportResponse,
+    summary="Combined Code Report",
+    description="Analyze code, calculate metrics and optionally inject bugs with a single model call.",
+)
+async def report_endpoint(request: ReportRequest, response: Response):
+    """
+    Get issues, metrics and optionally a bug-injected variant in one request.
+
+    - **code**: Optional code snippet. If not provided, uses code from /code-input endpoint
+    - **api_key**: Optional Gemini API key. If not provided, uses API_KEY from environment variables
+    - **include_injection**: Also inject bugs, using bug_type, severity_level and num_bugs
+    """
+    try:
+        code_to_analyze = request.code if request.code else get_stored_code()
+
+        if not code_to_analyze:
+            return ReportResponse(
+                status="error",
+                total_issues=0,
+                error_message="No code provided. Please provide code in request or load code using /code-input endpoint"
+            )
+
+        injection = {
+            "bug_type": request.bug_type,
+            "severity_level": request.severity_level,
+            "num_bugs": request.num_bugs
+        } if request.include_injection else None
+        result = await generate_report_service(code_to_analyze, api_key=request.api_key, injection=injection)
+
+        if not isinstance(result, dict):
+            return ReportResponse(
+                status="error",
+                total_issues=0,
+                error_message="Unexpected response format from AI service"
+            )
+
+        formatted_issues = _format_issues(result.get("issues", []))
+        injected = result.get("injection")
+        report_injection = None
+        if request.include_injection:
+            if not isinstance(injected, dict):
+                injected = {}
+            bugs = _format_bugs(injected.get("bugs_injected", []))
+            report_injection = ReportInjection(
+                buggy_code=injected.get("buggy_code", code_to_analyze),
+                bugs_injected=bugs,
+                total_bugs_injected=len(bugs)
+            )
+
+        return ReportResponse(
+            status="success",
+            issues=formatted_issues,
+            total_issues=len(formatted_issues),
+            summary_metrics=_build_summary_metrics(result.get("summary_metrics", {})),
+            issue_distribution=_build_issue_distribution(result.get("issue_distribution", {})),
+            injection=report_injection,
+            cached=result.get("cached", False),
+            estimated_input_tokens=result.get("estimated_input_tokens"),
+            truncated_output=result.get("truncated_output", False)
+        )
+    except OverloadedError as e:
+        # Upstream capacity exhausted - tell the client when to retry
+        response.status_code = 429
+        response.headers["Retry-After"] = str(e.retry_after)
+        return ReportResponse(status="error", total_issues=0, error_message=str(e))
+    except TokenBudgetError as e:
+        # Prompt estimated above MAX_INPUT_TOKENS - rejected before calling the model
+        response.status_code = 413
+        return ReportResponse(status="error", total_issues=0, error_message=str(e))
+    except ValueError as e:
+        # API key validation or other ValueError
+        error_msg = str(e)
+        print(f"API Key/Validation Error: {error_msg}")
+        return ReportResponse(status="error", total_issues=0, error_message=error_msg)
+    except Exception as e:
+        import traceback
+        error_msg = f"Error generating report: {str(e)}"
+        print(error_msg)
+        traceback.print_exc()
+        return ReportResponse(status="error", total_issues=0, error_message=error_msg)
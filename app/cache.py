@@ -0,0 +1,317 @@
+"""
+Result cache for the Gemini-backed services.
+Content-addressed, size-bounded LRU cache with per-entry TTL, optionally
+backed by a persistent SQLite tier that survives restarts.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_code(code_snippet: str) -> str:
+    """
+    Normalize code so that cosmetic differences do not defeat the cache.
+
+    Line endings are unified, trailing whitespace is stripped from every line
+    and trailing blank lines are dropped. Leading blank lines and indentation
+    are preserved, so line numbers in cached results stay valid.
+
+    Args:
+        code_snippet (str): Raw code as submitted by the client.
+
+    Returns:
+        str: Normalized code.
+    """
+    lines = code_snippet.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).rstrip("\n")
+
+
+def make_cache_key(endpoint: str, code_snippet: str, params: Optional[Dict[str, Any]],
+                   model: str, prompt_version: str) -> str:
+    """
+    Build a cache key from everything that influences an upstream result.
+
+    Args:
+        endpoint (str): Service name (e.g. 'analyze_code').
+        code_snippet (str): Code sent to the model.
+        params (dict, optional): Extra endpoint parameters (bug_type, severity_level, ...).
+        model (str): Model name used for the call.
+        prompt_version (str): Version of the prompt template.
+
+    Returns:
+        str: Hex SHA-256 digest identifying the request.
+    """
+    payload = json.dumps(
+        {
+            "endpoint": endpoint,
+            "code": hashlib.sha256(normalize_code(code_snippet).encode("utf-8")).hexdigest(),
+            "params": params or {},
+            "model": model,
+            "prompt_version": prompt_version,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Thread-safe in-memory LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return a copy of the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: dict, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entries when full."""
+        if self.max_entries <= 0:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        entry = (time.monotonic() + ttl, copy.deepcopy(value))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        """Remove a single entry if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class DiskCache:
+    """
+    Persistent cache tier stored in a SQLite database.
+
+    The database is opened lazily on first use, so startup cost does not grow
+    with the size of the cache; SQLite memory-maps and pages in only what each
+    lookup touches. Entries are evicted least-recently-used first once the
+    stored payloads exceed `max_bytes`, and a background thread periodically
+    purges expired rows and returns freed pages to the filesystem.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 7 * 24 * 3600, compact_interval: float = 600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.compact_interval = compact_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database and start the compactor on first use. Caller holds the lock."""
+        if self._conn is not None:
+            return self._conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.max_bytes) * 2}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at)")
+        self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self._conn = conn
+        if self.compact_interval > 0:
+            self._compactor = threading.Thread(target=self._compact_loop, name="disk-cache-compactor", daemon=True)
+            self._compactor.start()
+        logger.info(f"Opened disk cache at {self.path} ({self._total_bytes} bytes)")
+        return conn
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the stored value, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, size, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, size, expires_at = row
+            if expires_at <= now:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total_bytes -= size
+                return None
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: dict, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value and evict least recently used entries beyond the byte budget."""
+        payload = json.dumps(value, default=str)
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            conn = self._connect()
+            previous = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, now + ttl, now),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Delete least recently used rows until within budget. Caller holds the lock."""
+        excess = self._total_bytes - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self._total_bytes -= freed
+
+    def delete(self, key: str) -> None:
+        """Remove a single entry if present."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total_bytes -= row[0]
+
+    def clear(self) -> None:
+        """Drop every stored entry."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM entries")
+            self._total_bytes = 0
+
+    def compact(self) -> None:
+        """Purge expired entries and release free pages back to the filesystem."""
+        with self._lock:
+            if self._conn is None:
+                return
+            conn = self._conn
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _compact_loop(self) -> None:
+        while not self._stop.wait(self.compact_interval):
+            try:
+                self.compact()
+            except sqlite3.Error as e:
+                logger.error(f"Disk cache compaction failed: {str(e)}")
+
+    def close(self) -> None:
+        """Stop the compactor and close the database."""
+        self._stop.set()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class TieredCache:
+    """
+    Two-tier cache: the in-memory LRU in front of an optional disk tier.
+
+    Disk hits are promoted into memory. Disk failures are logged and treated
+    as misses so a broken cache never fails a request.
+    """
+
+    def __init__(self, memory: ResultCache, disk: Optional[DiskCache] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        try:
+            value = self.disk.get(key)
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Disk cache read failed: {str(e)}")
+            return None
+        if value is not None:
+            self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: dict) -> None:
+        self.memory.set(key, value)
+        if self.disk is None:
+            return
+        try:
+            self.disk.set(key, value)
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Disk cache write failed: {str(e)}")
+
+    async def aget(self, key: str) -> Optional[dict]:
+        """Like get(), but reads the disk tier off the event loop."""
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: dict) -> None:
+        """Like set(), but writes the disk tier off the event loop."""
+        if self.disk is None:
+            self.memory.set(key, value)
+            return
+        await asyncio.to_thread(self.set, key, value)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            try:
+                self.disk.delete(key)
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"Disk cache delete failed: {str(e)}")
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
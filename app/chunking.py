@@ -0,0 +1,172 @@
+"""
+AST-aware chunking of Python sources.
+Splits a module at top-level statement boundaries so each chunk can be
+analyzed independently, and maps chunk line numbers back to the original file.
+"""
+
+import ast
+from typing import List, Optional
+
+# Top-level statements shared with every chunk as context
+_CONTEXT_NODES = (ast.Import, ast.ImportFrom, ast.Assign, ast.AnnAssign)
+
+# Top-level statements that form their own chunk when splitting by definition
+_DEFINITION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+class Chunk:
+    """
+    One piece of a split module.
+
+    `code` is the text sent upstream: shared context statements from elsewhere
+    in the file followed by the chunk's own body. `line_map[i]` is the original
+    line number of line i + 1 of `code`.
+    """
+
+    def __init__(self, code: str, line_map: List[int], context_line_count: int):
+        self.code = code
+        self.line_map = line_map
+        self.context_line_count = context_line_count
+
+    @property
+    def start_line(self) -> int:
+        """Original line number where the chunk's body starts."""
+        return self.line_map[self.context_line_count]
+
+    @property
+    def end_line(self) -> int:
+        """Original line number where the chunk's body ends."""
+        return self.line_map[-1]
+
+    @property
+    def body(self) -> str:
+        """The chunk's own lines, without the prepended context."""
+        return "\n".join(self.code.split("\n")[self.context_line_count:])
+
+    def to_original_line(self, line_number: int) -> Optional[int]:
+        """
+        Map a line number within `code` back to the original file.
+
+        Returns None for lines outside the chunk or inside the prepended
+        context, which belong to another chunk.
+        """
+        if not self.context_line_count < line_number <= len(self.line_map):
+            return None
+        return self.line_map[line_number - 1]
+
+
+def _statement_start(node: ast.stmt) -> int:
+    """First line of a statement, including decorators."""
+    decorators = getattr(node, "decorator_list", None) or []
+    return min([node.lineno] + [decorator.lineno for decorator in decorators])
+
+
+def chunk_source(code: str, max_chunk_lines: int = 150) -> Optional[List[Chunk]]:
+    """
+    Split Python source at top-level function/class boundaries.
+
+    Consecutive top-level statements are packed into chunks of at most
+    `max_chunk_lines` lines (a single larger definition becomes its own chunk).
+    Every original line belongs to exactly one chunk body. Imports and global
+    assignments located outside a chunk are prepended to it as context.
+
+    Args:
+        code (str): Python source code.
+        max_chunk_lines (int): Target upper bound on body lines per chunk.
+
+    Returns:
+        list: Chunks in file order, or None if the code cannot be parsed or
+              does not split into at least two chunks.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    if len(tree.body) < 2:
+        return None
+
+    lines = code.split("\n")
+    starts = [_statement_start(node) for node in tree.body]
+
+    # Greedily pack statements into line ranges [begin, end] (1-based, inclusive)
+    ranges = []
+    begin = 1
+    for index, node in enumerate(tree.body):
+        if index > 0 and node.end_lineno - begin + 1 > max_chunk_lines and starts[index] > begin:
+            ranges.append((begin, starts[index] - 1))
+            begin = starts[index]
+    ranges.append((begin, len(lines)))
+    if len(ranges) < 2:
+        return None
+
+    return _build_chunks(lines, tree, ranges)
+
+
+def split_definitions(code: str) -> Optional[List[Chunk]]:
+    """
+    Split Python source into one chunk per top-level function or class.
+
+    Runs of other top-level statements (imports, globals, scripts) form their
+    own chunks, so every original line belongs to exactly one chunk body.
+    Each chunk's body is position independent, which makes it suitable for
+    fingerprinting a definition across edits elsewhere in the file.
+
+    Args:
+        code (str): Python source code.
+
+    Returns:
+        list: Chunks in file order, or None if the code cannot be parsed or
+              contains no top-level definitions.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    if not any(isinstance(node, _DEFINITION_NODES) for node in tree.body):
+        return None
+
+    lines = code.split("\n")
+    ranges = []
+    begin = 1
+    previous_was_definition = None
+    for node in tree.body:
+        is_definition = isinstance(node, _DEFINITION_NODES)
+        start = _statement_start(node)
+        # Cut before every definition and before the first statement after one
+        if previous_was_definition is not None and (is_definition or previous_was_definition) and start > begin:
+            ranges.append((begin, start - 1))
+            begin = start
+        previous_was_definition = is_definition
+    ranges.append((begin, len(lines)))
+    return _build_chunks(lines, tree, ranges)
+
+
+def chunks_for_ranges(code: str, ranges: List[tuple]) -> List[Chunk]:
+    """
+    Build chunks for explicit original line ranges of parseable Python source.
+
+    Args:
+        code (str): Python source code.
+        ranges (list): (first_line, last_line) tuples, 1-based and inclusive.
+
+    Returns:
+        list: One chunk per range, with context prepended as in chunk_source.
+    """
+    return _build_chunks(code.split("\n"), ast.parse(code), ranges)
+
+
+def _build_chunks(lines: List[str], tree: ast.Module, ranges: List[tuple]) -> List[Chunk]:
+    """Create chunks for line ranges, prepending context statements found outside each range."""
+    context_nodes = [node for node in tree.body if isinstance(node, _CONTEXT_NODES)]
+
+    chunks = []
+    for begin, end in ranges:
+        line_map = []
+        for node in context_nodes:
+            if node.end_lineno < begin or node.lineno > end:
+                line_map.extend(range(node.lineno, node.end_lineno + 1))
+        context_line_count = len(line_map)
+        line_map.extend(range(begin, end + 1))
+        chunk_code = "\n".join(lines[line_number - 1] for line_number in line_map)
+        chunks.append(Chunk(chunk_code, line_map, context_line_count))
+    return chunks
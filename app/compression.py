@@ -0,0 +1,206 @@
+"""
+Prompt compression for Python sources.
+Removes comments, docstrings and blank lines and collapses long literals,
+keeping a map from every compressed line back to its original line.
+"""
+
+import ast
+import io
+import tokenize
+from typing import List, Optional, Tuple
+
+# Single-line string literals longer than this (in characters) are shortened
+MAX_STRING_LENGTH = 120
+
+# Container literals of constants spanning more lines than this are collapsed
+MAX_LITERAL_LINES = 5
+
+# Elements kept when a container literal is collapsed
+_KEPT_ELEMENTS = 3
+
+
+class CompressedCode:
+    """
+    Compressed source and its line mapping.
+
+    `line_map[i]` is the original line number of line i + 1 of `code`.
+    """
+
+    def __init__(self, code: str, line_map: List[int]):
+        self.code = code
+        self.line_map = line_map
+
+    def to_original_line(self, line_number: int) -> Optional[int]:
+        """Map a line number of the compressed code to the original source."""
+        if not 1 <= line_number <= len(self.line_map):
+            return None
+        return self.line_map[line_number - 1]
+
+    def to_compressed_line(self, line_number: int) -> int:
+        """Map an original line number to the compressed line at or after it (or the last line)."""
+        for index, original in enumerate(self.line_map):
+            if original >= line_number:
+                return index + 1
+        return len(self.line_map)
+
+
+def _char_col(line: str, byte_col: int) -> int:
+    """Convert an ast UTF-8 byte offset into a character offset."""
+    return len(line.encode("utf-8")[:byte_col].decode("utf-8", errors="ignore"))
+
+
+def _is_constant_literal(node: ast.AST) -> bool:
+    """Whether a literal consists only of constants (possibly nested)."""
+    if isinstance(node, ast.Constant):
+        return True
+    if isinstance(node, ast.UnaryOp) and isinstance(node.operand, ast.Constant):
+        return True
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return all(_is_constant_literal(element) for element in node.elts)
+    if isinstance(node, ast.Dict):
+        return all(key is not None and _is_constant_literal(key) for key in node.keys) and \
+            all(_is_constant_literal(value) for value in node.values)
+    return False
+
+
+def _unparse_short(node: ast.AST) -> str:
+    """Source text of a constant literal, with long strings shortened."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, bytes)) \
+            and len(node.value) > MAX_STRING_LENGTH:
+        suffix = "..." if isinstance(node.value, str) else b"..."
+        return repr(node.value[:MAX_STRING_LENGTH // 2] + suffix)
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set, ast.Dict)):
+        return _collapsed_literal(node)
+    return ast.unparse(node)
+
+
+def _collapsed_literal(node: ast.AST) -> str:
+    """Short text for a large constant container: its first elements and a count of the rest."""
+    if isinstance(node, ast.Dict):
+        items = [f"{_unparse_short(key)}: {_unparse_short(value)}" for key, value in zip(node.keys, node.values)]
+        opening, closing = "{", "}"
+    else:
+        items = [_unparse_short(element) for element in node.elts]
+        opening, closing = {ast.List: ("[", "]"), ast.Tuple: ("(", ")"), ast.Set: ("{", "}")}[type(node)]
+    kept = items[:_KEPT_ELEMENTS]
+    # The remainder marker is a string element so the result stays valid Python
+    remainder = f"'... {len(items) - len(kept)} more'" if len(items) > len(kept) else ""
+    if remainder and isinstance(node, ast.Dict):
+        remainder = f"'...': {remainder}"
+    text = ", ".join(kept + ([remainder] if remainder else []))
+    if isinstance(node, ast.Tuple) and len(kept) == 1 and not remainder:
+        text += ","
+    return opening + text + closing
+
+
+def _docstring_nodes(tree: ast.Module) -> List[Tuple[ast.Expr, bool]]:
+    """Docstring expressions, with whether they are the only statement of their body."""
+    found = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                    and isinstance(body[0].value.value, str):
+                found.append((body[0], len(body) == 1))
+    return found
+
+
+def compress_code(code_snippet: str) -> Optional[CompressedCode]:
+    """
+    Compress Python source for prompting.
+
+    Comments, docstrings and blank lines are removed, single-line string
+    literals longer than MAX_STRING_LENGTH are shortened and constant
+    container literals spanning more than MAX_LITERAL_LINES lines are
+    collapsed onto one line. The result still parses.
+
+    Args:
+        code_snippet (str): Python source code.
+
+    Returns:
+        CompressedCode: The compressed code, or None if the source does not
+                        parse or nothing could be removed.
+    """
+    try:
+        tree = ast.parse(code_snippet)
+        tokens = list(tokenize.generate_tokens(io.StringIO(code_snippet).readline))
+    except (SyntaxError, ValueError, tokenize.TokenError):
+        return None
+
+    lines = code_snippet.split("\n")
+    # Replacements as (start_line, start_col, end_line, end_col, text); 1-based lines, character columns
+    replacements = []
+
+    for node, only_statement in _docstring_nodes(tree):
+        replacements.append((
+            node.lineno, _char_col(lines[node.lineno - 1], node.col_offset),
+            node.end_lineno, _char_col(lines[node.end_lineno - 1], node.end_col_offset),
+            "..." if only_statement else "",
+        ))
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set, ast.Dict)) \
+                and node.end_lineno - node.lineno + 1 > MAX_LITERAL_LINES and _is_constant_literal(node):
+            start_col = _char_col(lines[node.lineno - 1], node.col_offset)
+            end_col = _char_col(lines[node.end_lineno - 1], node.end_col_offset)
+            if isinstance(node, ast.Tuple) and lines[node.lineno - 1][start_col:start_col + 1] != "(":
+                continue  # Unparenthesized tuple - leave it alone
+            replacements.append((node.lineno, start_col, node.end_lineno, end_col, _collapsed_literal(node)))
+
+    # Lines inside multi-line strings must be kept verbatim, even when blank
+    protected = set()
+    for token in tokens:
+        if token.type == tokenize.COMMENT:
+            replacements.append((token.start[0], token.start[1], token.end[0], token.end[1], ""))
+        elif token.type == tokenize.STRING:
+            if token.start[0] != token.end[0]:
+                protected.update(range(token.start[0] + 1, token.end[0] + 1))
+            elif len(token.string) > MAX_STRING_LENGTH:
+                try:
+                    value = ast.literal_eval(token.string)
+                except (ValueError, SyntaxError):
+                    continue
+                if isinstance(value, str):
+                    shortened = repr(value[:MAX_STRING_LENGTH // 2] + "...")
+                elif isinstance(value, bytes):
+                    shortened = repr(value[:MAX_STRING_LENGTH // 2] + b"...")
+                else:
+                    continue
+                replacements.append((token.start[0], token.start[1], token.end[0], token.end[1], shortened))
+
+    # Keep only outermost replacements, then apply them back to front
+    replacements.sort(key=lambda r: (r[0], r[1], -r[2], -r[3]))
+    kept = []
+    for replacement in replacements:
+        if kept and (replacement[0], replacement[1]) < (kept[-1][2], kept[-1][3]):
+            continue
+        kept.append(replacement)
+        # Lines swallowed by a replacement are no longer inside a kept string
+        protected.difference_update(range(replacement[0] + 1, replacement[2] + 1))
+
+    numbered: List[Tuple[int, str]] = [(index + 1, line) for index, line in enumerate(lines)]
+    for start_line, start_col, end_line, end_col, text in reversed(kept):
+        head = numbered[start_line - 1][1][:start_col]
+        tail = numbered[end_line - 1][1][end_col:]
+        numbered[start_line - 1:end_line] = [(start_line, head + text + tail)] + \
+            [(line, "") for line in range(start_line + 1, end_line + 1)]
+
+    compressed_lines = []
+    line_map = []
+    for line_number, text in numbered:
+        if line_number in protected:
+            compressed_lines.append(text)
+        elif text.strip():
+            compressed_lines.append(text.rstrip())
+        else:
+            continue
+        line_map.append(line_number)
+
+    compressed = "\n".join(compressed_lines)
+    if len(compressed) >= len(code_snippet):
+        return None
+    try:
+        ast.parse(compressed)
+    except SyntaxError:
+        return None
+    return CompressedCode(compressed, line_map)
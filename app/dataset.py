@@ -0,0 +1,327 @@
+"""
+Bulk bug-injection dataset generation.
+Runs inject_bugs over every snippet x bug type x severity level with bounded
+parallelism and emits one JSON record per distinct buggy variant as soon as it
+is ready. write_dataset appends the records to a JSONL file and checkpoints
+progress next to it, so an interrupted run resumes where it stopped.
+
+Usage:
+    python -m app.dataset snippets/ -o dataset.jsonl -t "Division by Zero" -t "SQL Injection" -s 3 -s 5
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional, Sequence, Set, Tuple
+
+from app.cache import normalize_code
+from app.scheduler import OverloadedError
+from app.services import BATCH_MAX_PARALLEL, inject_bugs
+
+logger = logging.getLogger(__name__)
+
+RECORD_OK = "ok"
+RECORD_DUPLICATE = "duplicate"
+RECORD_FAILED = "failed"
+
+# Times a task waits out an overloaded upstream (OverloadedError.retry_after) before failing
+OVERLOAD_RETRIES = 5
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def variant_hash(buggy_code: str) -> str:
+    """Identity of a buggy variant; variants differing only cosmetically share it."""
+    return _digest(normalize_code(buggy_code))
+
+
+def iter_tasks(snippets: Iterable[Tuple[str, str]], bug_types: Sequence[str], severity_levels: Sequence[int],
+               num_bugs: int = 2, engine: str = "auto", output_mode: str = "full") -> Iterator[Dict]:
+    """
+    Lazily expand snippets into one task per bug type and severity level.
+
+    Args:
+        snippets (iterable): (snippet_id, code) pairs, e.g. a file path and its contents.
+        bug_types (sequence): Bug types to inject.
+        severity_levels (sequence): Severity levels (1-5) to inject at.
+        num_bugs (int): Bugs to inject per variant.
+        engine, output_mode: Passed to inject_bugs.
+
+    Yields:
+        dict: Task with 'task_id' (stable across runs, identical for identical
+              code and parameters), 'snippet_id', 'code', 'bug_type',
+              'severity_level', 'num_bugs', 'engine' and 'output_mode'.
+              Repeated tasks are yielded once.
+    """
+    seen = set()
+    for snippet_id, code in snippets:
+        if not code.strip():
+            continue
+        normalized = normalize_code(code)
+        for bug_type in bug_types:
+            for severity_level in severity_levels:
+                task_id = _digest(normalized, bug_type, severity_level, num_bugs, engine, output_mode)
+                if task_id in seen:
+                    continue
+                seen.add(task_id)
+                yield {
+                    "task_id": task_id,
+                    "snippet_id": snippet_id,
+                    "code": code,
+                    "bug_type": bug_type,
+                    "severity_level": severity_level,
+                    "num_bugs": num_bugs,
+                    "engine": engine,
+                    "output_mode": output_mode,
+                }
+
+
+async def _run_task(task: Dict, api_key: Optional[str]) -> Dict:
+    """Inject bugs for one task; returns its record (without the dedupe verdict)."""
+    record = {
+        "task_id": task["task_id"],
+        "snippet_id": task["snippet_id"],
+        "bug_type": task["bug_type"],
+        "severity_level": task["severity_level"],
+        "num_bugs": task["num_bugs"],
+    }
+    for attempt in range(OVERLOAD_RETRIES + 1):
+        try:
+            result = await inject_bugs(
+                task["code"], task["bug_type"], task["severity_level"], task["num_bugs"],
+                api_key=api_key, engine=task["engine"], output_mode=task["output_mode"]
+            )
+            break
+        except OverloadedError as e:
+            if attempt == OVERLOAD_RETRIES:
+                return {**record, "status": RECORD_FAILED, "error_message": str(e)}
+            await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            logger.warning(f"Dataset task {task['task_id'][:12]} failed: {e}")
+            return {**record, "status": RECORD_FAILED, "error_message": str(e)}
+
+    buggy_code = result.get("buggy_code", "")
+    if not result.get("bugs_injected") or result.get("truncated_output") \
+            or normalize_code(buggy_code) == normalize_code(task["code"]):
+        return {**record, "status": RECORD_FAILED, "error_message": "No bugs were injected"}
+    return {
+        **record,
+        "status": RECORD_OK,
+        "original_code": task["code"],
+        "buggy_code": buggy_code,
+        "bugs_injected": result["bugs_injected"],
+        "engine": result.get("engine"),
+        "model": result.get("model"),
+        "variant_hash": variant_hash(buggy_code),
+    }
+
+
+async def generate_records(tasks: Iterable[Dict], max_parallel: int = None,
+                           skip_tasks: Set[str] = frozenset(), seen_variants: Set[str] = None,
+                           api_key: str = None) -> AsyncIterator[Dict]:
+    """
+    Run tasks from iter_tasks with at most `max_parallel` in flight and yield their records as they complete.
+
+    Tasks are pulled from the iterable only when a worker is free, so neither
+    tasks nor results accumulate in memory. Records have a 'status':
+    "ok" (a new variant), "duplicate" (same buggy code as an earlier variant,
+    'buggy_code' omitted) or "failed" (with 'error_message').
+
+    Args:
+        tasks (iterable): Tasks as produced by iter_tasks, which fixes their num_bugs, engine and output_mode.
+        max_parallel (int, optional): Concurrency bound. Defaults to BATCH_MAX_PARALLEL.
+        skip_tasks (set): Task ids to leave out, e.g. ones finished by an earlier run.
+        seen_variants (set, optional): Variant hashes already emitted; updated in place.
+        api_key (str, optional): Passed to inject_bugs.
+
+    Yields:
+        dict: One record per task, in completion order.
+    """
+    seen_variants = set() if seen_variants is None else seen_variants
+    pending = (task for task in tasks if task["task_id"] not in skip_tasks)
+    parallel = max_parallel or BATCH_MAX_PARALLEL
+    results = asyncio.Queue(maxsize=parallel)
+
+    async def _worker():
+        # Workers share the generator; the event loop runs one next() at a time
+        try:
+            for task in pending:
+                await results.put(await _run_task(task, api_key))
+        except Exception as e:
+            # Raised while producing tasks (e.g. by the snippet source); re-raised by the consumer
+            await results.put(e)
+            return
+        await results.put(None)
+
+    workers = [asyncio.create_task(_worker()) for _ in range(parallel)]
+    try:
+        running = len(workers)
+        while running:
+            record = await results.get()
+            if record is None:
+                running -= 1
+                continue
+            if isinstance(record, Exception):
+                raise record
+            if record["status"] == RECORD_OK:
+                if record["variant_hash"] in seen_variants:
+                    record = {
+                        key: value for key, value in record.items()
+                        if key not in ("original_code", "buggy_code", "bugs_injected")
+                    }
+                    record["status"] = RECORD_DUPLICATE
+                else:
+                    seen_variants.add(record["variant_hash"])
+            yield record
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+
+def _truncate_partial_line(path: Path, block_size: int = 65536) -> None:
+    """Drop an unterminated last line left by an interrupted write, reading backwards from the end."""
+    with open(path, "rb+") as f:
+        end = f.seek(0, 2)
+        position = end
+        while position > 0:
+            start = max(0, position - block_size)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            position = start
+        else:
+            keep = 0
+        if keep != end:
+            f.truncate(keep)
+
+
+def _read_jsonl(path: Path) -> Iterator[Dict]:
+    if not path.exists():
+        return
+    _truncate_partial_line(path)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def checkpoint_path(output_path: str) -> Path:
+    """Progress file kept next to a dataset: one line per finished task."""
+    return Path(f"{output_path}.progress")
+
+
+async def write_dataset(tasks: Iterable[Dict], output_path: str, resume: bool = True, **options) -> Dict[str, int]:
+    """
+    Generate a dataset into a JSONL file, one line per distinct buggy variant.
+
+    Every finished task is also recorded in checkpoint_path(output_path). When
+    resuming, tasks that produced a variant or a duplicate are skipped, failed
+    tasks are retried and variants already in the output are not written again.
+    Task ids cover num_bugs, engine and output_mode, so resuming with other
+    parameters runs the tasks again instead of skipping them.
+
+    Args:
+        tasks (iterable): Tasks as produced by iter_tasks.
+        output_path (str): JSONL file to append to.
+        resume (bool): Continue an earlier run; if False the output and progress files are overwritten.
+        **options: Passed to generate_records (max_parallel, api_key).
+
+    Returns:
+        dict: Counts of 'written', 'duplicates' and 'failed' tasks in this run and
+              of tasks 'resumed' (skipped as already done).
+    """
+    output = Path(output_path)
+    progress = checkpoint_path(output_path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if not resume:
+        for path in (output, progress):
+            if path.exists():
+                path.unlink()
+
+    # The output is written before the progress line, so a variant can be in
+    # the output while its task is not yet marked done; the hash set covers that
+    seen_variants = {record["variant_hash"] for record in _read_jsonl(output)}
+    done = {
+        entry["task_id"] for entry in _read_jsonl(progress)
+        if entry["status"] in (RECORD_OK, RECORD_DUPLICATE)
+    }
+    counts = {"written": 0, "duplicates": 0, "failed": 0, "resumed": len(done)}
+    if done:
+        logger.info(f"Resuming dataset {output}: {len(done)} tasks already done")
+
+    with open(output, "a", encoding="utf-8") as out, open(progress, "a", encoding="utf-8") as log:
+        async for record in generate_records(tasks, skip_tasks=done, seen_variants=seen_variants, **options):
+            if record["status"] == RECORD_OK:
+                out.write(json.dumps({k: v for k, v in record.items() if k != "status"}) + "\n")
+                out.flush()
+                counts["written"] += 1
+            else:
+                counts["duplicates" if record["status"] == RECORD_DUPLICATE else "failed"] += 1
+            entry = {"task_id": record["task_id"], "status": record["status"]}
+            if "error_message" in record:
+                entry["error_message"] = record["error_message"]
+            log.write(json.dumps(entry) + "\n")
+            log.flush()
+    return counts
+
+
+def read_snippets(sources: Sequence[str], pattern: str = "*.py") -> Iterator[Tuple[str, str]]:
+    """
+    Yield (path, code) for each file in `sources`, walking directories for files matching `pattern`.
+
+    Files are read one at a time, as the tasks reach them.
+    """
+    for source in sources:
+        path = Path(source)
+        files = sorted(path.rglob(pattern)) if path.is_dir() else [path]
+        for file in files:
+            try:
+                yield str(file), file.read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Skipping {file}: {e}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.dataset",
+        description="Generate a JSONL bug-injection dataset from source files (resumable)."
+    )
+    parser.add_argument("sources", nargs="+", help="Source files or directories")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file to write (progress is kept in OUTPUT.progress)")
+    parser.add_argument("-t", "--bug-type", dest="bug_types", action="append", required=True,
+                        help="Bug type to inject; repeat for several")
+    parser.add_argument("-s", "--severity", dest="severity_levels", action="append", type=int,
+                        choices=range(1, 6), help="Severity level 1-5; repeat for several (default: 5)")
+    parser.add_argument("-n", "--num-bugs", type=int, default=2, help="Bugs per variant (default: 2)")
+    parser.add_argument("-j", "--max-parallel", type=int, default=BATCH_MAX_PARALLEL,
+                        help=f"Tasks in flight (default: BATCH_MAX_PARALLEL, {BATCH_MAX_PARALLEL})")
+    parser.add_argument("--pattern", default="*.py", help="File pattern for directories (default: *.py)")
+    parser.add_argument("--engine", choices=["auto", "local", "model"], default="auto")
+    parser.add_argument("--output-mode", choices=["full", "edits"], default="full")
+    parser.add_argument("--api-key", default=None, help="Gemini API key (default: API_KEY from the environment)")
+    parser.add_argument("--restart", action="store_true", help="Discard earlier progress instead of resuming")
+    args = parser.parse_args(argv)
+
+    tasks = iter_tasks(
+        read_snippets(args.sources, args.pattern), args.bug_types, args.severity_levels or [5],
+        num_bugs=args.num_bugs, engine=args.engine, output_mode=args.output_mode
+    )
+    counts = asyncio.run(write_dataset(
+        tasks, args.output, resume=not args.restart, max_parallel=args.max_parallel, api_key=args.api_key
+    ))
+    print(
+        f"{counts['written']} variants written to {args.output}, {counts['duplicates']} duplicates, "
+        f"{counts['failed']} failed, {counts['resumed']} tasks done by an earlier run"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Line-anchored code edits.
+Applies the edits returned by the model in edits output mode to the original
+code, so the full modified file never has to be generated, and computes the
+line numbers of the edits in the result.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+
+def number_lines(code_snippet: str) -> str:
+    """Prefix every line with its 1-based number ("  12| code"), for prompts that anchor edits to lines."""
+    lines = code_snippet.split("\n")
+    width = len(str(len(lines)))
+    return "\n".join(f"{number:>{width}}| {line}" for number, line in enumerate(lines, start=1))
+
+
+def _normalized(lines: List[str]) -> List[str]:
+    return [line.strip() for line in lines]
+
+
+def _locate(lines: List[str], edit: Dict) -> Optional[Tuple[int, int]]:
+    """
+    0-based [start, end) range of the lines an edit replaces, or None if it cannot be anchored.
+
+    The stated range is used when its text matches `original` (ignoring
+    indentation and trailing whitespace). Otherwise the edit is re-anchored to
+    the unique occurrence of `original` in the file, which fixes line numbers
+    the model miscounted.
+    """
+    start, end = edit["line_start"] - 1, edit["line_end"]
+    original = edit.get("original")
+    if original is None or not original.strip():
+        return (start, end) if 0 <= start < end <= len(lines) else None
+    wanted = _normalized(original.strip("\n").split("\n"))
+    if 0 <= start < end <= len(lines) and _normalized(lines[start:end]) == wanted:
+        return start, end
+    matches = [
+        index for index in range(len(lines) - len(wanted) + 1)
+        if _normalized(lines[index:index + len(wanted)]) == wanted
+    ]
+    if len(matches) == 1:
+        return matches[0], matches[0] + len(wanted)
+    return None
+
+
+def apply_edits(code_snippet: str, edits: List[Dict]) -> Tuple[str, List[Dict], int]:
+    """
+    Apply line-range replacements to code.
+
+    Each edit has 'line_start' and 'line_end' (1-based, inclusive lines of the
+    original code), 'original' (the text of those lines), 'replacement' (new
+    text, empty to delete the lines), 'type' and 'description'. Edits that
+    cannot be anchored or overlap an earlier edit are skipped.
+
+    Args:
+        code_snippet (str): The original code.
+        edits (list): Edits as returned by the model.
+
+    Returns:
+        tuple: (modified code, one bug per applied edit with 'type',
+                'line_number' in the modified code and 'description',
+                number of skipped edits).
+    """
+    lines = code_snippet.split("\n")
+    located = []
+    skipped = 0
+    for edit in edits:
+        span = _locate(lines, edit)
+        if span is None or any(span[0] < other_end and other_start < span[1] for other_start, other_end, _ in located):
+            skipped += 1
+            continue
+        located.append((span[0], span[1], edit))
+    located.sort(key=lambda item: item[0])
+
+    result = []
+    bugs = []
+    position = 0
+    for start, end, edit in located:
+        result.extend(lines[position:start])
+        replacement = edit.get("replacement") or ""
+        bugs.append({
+            "type": edit.get("type", ""),
+            # First replaced line, or the line that follows a deletion
+            "line_number": len(result) + 1,
+            "description": edit.get("description", ""),
+        })
+        if replacement:
+            result.extend(replacement.rstrip("\n").split("\n"))
+        position = end
+    result.extend(lines[position:])
+    for bug in bugs:
+        # A deletion at the very end has no following line
+        bug["line_number"] = max(1, min(bug["line_number"], len(result)))
+    return "\n".join(result), bugs, skipped
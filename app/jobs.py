@@ -0,0 +1,166 @@
+"""
+Asynchronous job subsystem for long-running analyses.
+Work is queued to an in-process worker pool; results are kept in a bounded
+store and evicted after a TTL.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.scheduler import OverloadedError
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobFailed(Exception):
+    """
+    Raised by a runner whose work finished with an error result, to fail the
+    job while keeping that result and, if the failure was overload, a retry hint.
+    """
+
+    def __init__(self, message: str, result: Any = None, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.result = result
+        self.retry_after = retry_after
+
+
+class Job:
+    """A unit of submitted work and its outcome."""
+
+    def __init__(self, kind: str, runner: Callable[[], Awaitable[Any]]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.retry_after: Optional[int] = None
+        self.runner = runner
+        self.done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+
+class JobManager:
+    """
+    Runs submitted jobs on a fixed pool of worker tasks.
+
+    At most `max_pending` jobs may wait in the queue; the store keeps up to
+    `max_jobs` jobs and drops finished ones `ttl_seconds` after completion,
+    or earlier (oldest first) when it is full.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 100,
+                 max_jobs: int = 1000, ttl_seconds: float = 3600):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _ensure_workers(self) -> None:
+        """Start the worker pool on first use, inside the running event loop."""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.ensure_future(self._worker()))
+
+    def _evict(self) -> None:
+        """Drop expired jobs, then the oldest finished ones while over capacity."""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.ttl_seconds:
+                del self._jobs[job_id]
+        if len(self._jobs) >= self.max_jobs:
+            for job_id, job in list(self._jobs.items()):
+                if job.finished:
+                    del self._jobs[job_id]
+                    if len(self._jobs) < self.max_jobs:
+                        break
+
+    def submit(self, kind: str, runner: Callable[[], Awaitable[Any]]) -> Job:
+        """
+        Queue a job for background execution.
+
+        Args:
+            kind (str): Job type, for reporting.
+            runner (callable): Zero-argument coroutine function doing the work.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            OverloadedError: If the queue or the job store is full.
+        """
+        self._ensure_workers()
+        self._evict()
+        if len(self._jobs) >= self.max_jobs or self._queue.full():
+            raise OverloadedError("Too many pending jobs. Retry later.", retry_after=30)
+        job = Job(kind, runner)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job; expired jobs are reported as missing."""
+        self._evict()
+        return self._jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Long-poll: return the job once finished or after `timeout` seconds."""
+        job = self.get(job_id)
+        if job is None or job.finished or timeout <= 0:
+            return job
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = await job.runner()
+                job.status = JOB_SUCCEEDED
+            except JobFailed as e:
+                logger.warning(f"Job {job.id} failed: {str(e)}")
+                job.result = e.result
+                job.error = str(e)
+                job.retry_after = e.retry_after
+                job.status = JOB_FAILED
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}", exc_info=True)
+                job.error = str(e)
+                job.status = JOB_FAILED
+            finally:
+                job.runner = None
+                job.finished_at = time.time()
+                job.done.set()
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, int]:
+        """Counts of stored jobs by status."""
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
@@ -0,0 +1,200 @@
+"""
+Tolerant parser for JSON produced by the model.
+Finds the JSON object anywhere in a reply (markdown fences, leading or
+trailing prose), repairs common defects and salvages the complete part of a
+truncated reply, reporting what it had to do.
+"""
+
+import json
+import re
+from typing import List, Optional
+
+# Markdown code fence opening a JSON block
+_FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*\n")
+
+# Python literals the model sometimes emits instead of JSON ones
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class ParsedOutput:
+    """
+    Result of parse_model_json.
+
+    `value` is the recovered JSON object, or None if nothing usable was found.
+    `repairs` lists what had to be fixed, `truncated` tells whether the reply
+    ended before the object was closed and `recovered_fraction` is the share
+    of the payload's characters (from its opening brace) kept in `value`.
+    """
+
+    def __init__(self, value: Optional[dict], repairs: List[str], truncated: bool, recovered_fraction: float):
+        self.value = value
+        self.repairs = repairs
+        self.truncated = truncated
+        self.recovered_fraction = recovered_fraction
+
+    @property
+    def repaired(self) -> bool:
+        """Whether the reply needed any repair to parse."""
+        return bool(self.repairs)
+
+    def describe(self) -> str:
+        """Short human-readable summary, for logging."""
+        if self.value is None:
+            return "no JSON object recovered"
+        if not self.repairs:
+            return "clean"
+        return f"{', '.join(self.repairs)}; kept {self.recovered_fraction:.0%} of the payload"
+
+
+def _payload_start(text: str) -> int:
+    """Index of the opening brace of the JSON object, preferring one inside a code fence; -1 if none."""
+    fence = _FENCE_PATTERN.search(text)
+    if fence:
+        start = text.find("{", fence.end())
+        if start != -1:
+            return start
+    return text.find("{")
+
+
+def _scan(text: str, start: int):
+    """
+    Scan a JSON value starting at `start`.
+
+    Returns:
+        tuple: (end index after the closing brace or None if the value is not
+                closed, last safe cut (index, open brackets) or None). A safe
+                cut lies right after a complete member of the outer object or a
+                complete array item, with only arrays open below the outer
+                object, so closing the open brackets never leaves a partial
+                object (such as half an issue) behind.
+    """
+    stack = []
+    in_string = False
+    escape = False
+    safe_cut = None
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if not stack:
+                return i, safe_cut
+            stack.pop()
+            if not stack:
+                return i + 1, safe_cut
+            if "{" not in stack[1:]:
+                safe_cut = (i + 1, "".join(stack))
+        elif ch == "," and "{" not in stack[1:]:
+            safe_cut = (i, "".join(stack))
+    return None, safe_cut
+
+
+def _repair(payload: str) -> str:
+    """Drop trailing commas and replace Python literals, outside of strings."""
+    out = []
+    in_string = False
+    escape = False
+    i = 0
+    while i < len(payload):
+        ch = payload[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            out.append(ch)
+            i += 1
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch == ",":
+            following = i + 1
+            while following < len(payload) and payload[following].isspace():
+                following += 1
+            if payload[following:following + 1] in ("}", "]"):
+                i += 1
+                continue
+        elif ch.isalpha():
+            end = i
+            while end < len(payload) and payload[end].isalnum():
+                end += 1
+            word = payload[i:end]
+            out.append(_PYTHON_LITERALS.get(word, word))
+            i = end
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _loads(payload: str):
+    """json.loads that accepts raw control characters (e.g. newlines) inside strings."""
+    return json.loads(payload, strict=False)
+
+
+def parse_model_json(text: str) -> ParsedOutput:
+    """
+    Recover a JSON object from model output.
+
+    Tries, in order: the text as is; the object located inside it (after a
+    ```json fence if there is one, ignoring surrounding prose); that object with
+    trailing commas removed and Python literals (True/False/None) replaced; and
+    for a truncated reply, the object cut after its last complete member or
+    array item with the open brackets closed, which keeps every complete issue
+    of a cut-off array.
+
+    Args:
+        text (str): Raw model output.
+
+    Returns:
+        ParsedOutput: The recovered object and a report of the repairs.
+    """
+    stripped = text.strip()
+    try:
+        value = _loads(stripped)
+        if isinstance(value, dict):
+            return ParsedOutput(value, [], False, 1.0)
+    except json.JSONDecodeError:
+        pass
+
+    start = _payload_start(text)
+    if start == -1:
+        return ParsedOutput(None, [], False, 0.0)
+    repairs = []
+    end, safe_cut = _scan(text, start)
+    if text[:start].strip() or (end is not None and text[end:].strip()):
+        repairs.append("ignored text around the JSON")
+
+    truncated = end is None
+    if not truncated:
+        payload, fraction = text[start:end], 1.0
+    elif safe_cut is not None:
+        cut, open_brackets = safe_cut
+        payload = text[start:cut] + "".join(_CLOSERS[bracket] for bracket in reversed(open_brackets))
+        fraction = (cut - start) / max(len(text) - start, 1)
+        repairs.append("closed truncated JSON")
+    else:
+        return ParsedOutput(None, repairs, True, 0.0)
+
+    for fixed, note in ((payload, None), (_repair(payload), "fixed trailing commas or Python literals")):
+        try:
+            value = _loads(fixed)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return ParsedOutput(value, repairs + ([note] if note else []), truncated, fraction)
+    return ParsedOutput(None, repairs, truncated, 0.0)
@@ -0,0 +1,113 @@
+"""
+Pooled Gemini chat clients and chains.
+Clients are created once per API key and model and reused across requests,
+keeping their upstream connections alive. Each client carries its own
+credentials, so calls with different keys never share SDK state.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from google.ai import generativelanguage as glm
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+logger = logging.getLogger(__name__)
+
+_output_parser = StrOutputParser()
+
+# Whether the installed SDK can ask Gemini for a JSON response (generation_config.response_mime_type)
+JSON_MODE_SUPPORTED = "response_mime_type" in glm.GenerationConfig.meta.fields
+
+
+def _bind_credentials(llm: ChatGoogleGenerativeAI, api_key: str) -> None:
+    """
+    Give the client's underlying GenerativeModel transports of its own.
+
+    Without this, google-generativeai lazily attaches the process-wide default
+    transport, which carries whichever key was passed to `genai.configure`
+    last, so concurrent requests with different keys could cross.
+    """
+    client_options = {"api_key": api_key}
+    llm.client._client = glm.GenerativeServiceClient(client_options=client_options)
+    llm.client._async_client = glm.GenerativeServiceAsyncClient(client_options=client_options)
+
+
+class _PoolEntry:
+    """A chat client and the chains built on top of it."""
+
+    def __init__(self, llm: ChatGoogleGenerativeAI):
+        self.llm = llm
+        self.chains: Dict[Tuple[int, Optional[int], bool], Runnable] = {}
+
+
+class ClientPool:
+    """Bounded LRU pool of chat clients keyed by API key and model name."""
+
+    def __init__(self, max_clients: int = 16):
+        self.max_clients = max_clients
+        self._entries: "OrderedDict[Tuple[str, str], _PoolEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, api_key: str, model: str) -> _PoolEntry:
+        pool_key = (api_key, model)
+        with self._lock:
+            entry = self._entries.get(pool_key)
+            if entry is None:
+                logger.info(f"Creating Gemini client for model {model}")
+                # Construction still calls genai.configure internally; holding the
+                # lock keeps that confined to pool misses, and the transports bound
+                # below make the global setting irrelevant for every call
+                llm = ChatGoogleGenerativeAI(
+                    model=model, google_api_key=api_key, convert_system_message_to_human=True
+                )
+                _bind_credentials(llm, api_key)
+                entry = _PoolEntry(llm)
+                self._entries[pool_key] = entry
+                while len(self._entries) > self.max_clients:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(pool_key)
+            return entry
+
+    def get_chain(self, api_key: str, model: str, prompt: ChatPromptTemplate,
+                  max_output_tokens: Optional[int] = None, json_mode: bool = False) -> Runnable:
+        """
+        Return the `prompt | llm | parser` chain for this key and model.
+
+        Args:
+            api_key (str): Gemini API key.
+            model (str): Gemini model name.
+            prompt (ChatPromptTemplate): One of the module-level templates in app.prompts.
+            max_output_tokens (int, optional): Cap on generated tokens, bound into the
+                generation config of every call made through the chain.
+            json_mode (bool): Request a JSON response where the SDK supports it
+                (see JSON_MODE_SUPPORTED); ignored otherwise.
+
+        Returns:
+            Runnable: Chain producing the raw model text.
+        """
+        entry = self._entry(api_key, model)
+        json_mode = json_mode and JSON_MODE_SUPPORTED
+        chain_key = (id(prompt), max_output_tokens, json_mode)
+        chain = entry.chains.get(chain_key)
+        if chain is None:
+            llm = entry.llm
+            generation_config = {}
+            if max_output_tokens is not None:
+                generation_config["max_output_tokens"] = max_output_tokens
+            if json_mode:
+                generation_config["response_mime_type"] = "application/json"
+            if generation_config:
+                llm = llm.bind(generation_config=generation_config)
+            chain = prompt | llm | _output_parser
+            entry.chains[chain_key] = chain
+        return chain
+
+    def clear(self) -> None:
+        """Drop every pooled client."""
+        with self._lock:
+            self._entries.clear()
@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import routes_code_input, routes_analyze_code, routes_code_metrics, routes_inject_bugs
+from app.api import routes_code_input, routes_analyze_code, routes_code_metrics, routes_inject_bugs, routes_jobs, routes_report
+from app.services import single_flight, upstream_limiter
 
 app = FastAPI(
     title="Code Analyzer and Bug Generator API",
@@ -20,8 +21,15 @@ app.add_middleware(
 # Health check endpoint
 @app.get("/health")
 def health_check():
-    """Health check endpoint."""
-    return {"status": "ok", "service": "code-analyzer"}
+    """Health check endpoint, with the current load of the service."""
+    return {
+        "status": "ok",
+        "service": "code-analyzer",
+        # Distinct results being computed; identical concurrent requests share one
+        "single_flight_keys": single_flight.in_flight(),
+        "upstream": upstream_limiter.stats(),
+        "jobs": routes_jobs.job_manager.stats()
+    }
 
 # Root endpoint
 @app.get("/")
@@ -34,8 +42,11 @@ def root():
         "endpoints": {
             "code_input": "/api/code-input",
             "analyze": "/api/analyze-code",
+            "analyze_stream": "/api/analyze-code/stream",
             "metrics": "/api/code-metrics",
-            "inject_bugs": "/api/inject-bugs"
+            "inject_bugs": "/api/inject-bugs",
+            "report": "/api/report",
+            "jobs": "/api/jobs"
         },
         "note": "All endpoints accept an optional 'api_key' parameter. If not provided, API_KEY from environment will be used."
     }
@@ -44,4 +55,6 @@ def root():
 app.include_router(routes_code_input.router, prefix="/api", tags=["Code Input"])
 app.include_router(routes_analyze_code.router, prefix="/api", tags=["Code Analysis"])
 app.include_router(routes_code_metrics.router, prefix="/api", tags=["Code Metrics"])
-app.include_router(routes_inject_bugs.router, prefix="/api", tags=["Bug Injection"])
\ No newline at end of file
+app.include_router(routes_inject_bugs.router, prefix="/api", tags=["Bug Injection"])
+app.include_router(routes_report.router, prefix="/api", tags=["Report"])
+app.include_router(routes_jobs.router, prefix="/api", tags=["Jobs"])
\ No newline at end of file
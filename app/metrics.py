@@ -0,0 +1,313 @@
+"""
+Local code metrics.
+Deterministic size, complexity and Halstead measures computed with `ast` and
+`tokenize`, and summary metrics aggregated from analysis issues, without any
+model call.
+"""
+
+import ast
+import io
+import keyword
+import math
+import statistics
+import tokenize
+from typing import Dict, List, Optional
+
+# Statements that open a nested control-flow block
+_BLOCK_NODES = (
+    ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try,
+) + tuple(getattr(ast, name) for name in ("TryStar", "Match") if hasattr(ast, name))
+
+# Nodes that add one independent path each
+_DECISION_NODES = (
+    ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.Assert,
+) + tuple(getattr(ast, name) for name in ("match_case",) if hasattr(ast, name))
+
+_FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+# Function length buckets (upper bounds, inclusive) for the distribution
+_LENGTH_BUCKETS = ((10, "1-10"), (25, "11-25"), (50, "26-50"), (None, "51+"))
+
+# Tokens that close a bracket are not counted again as Halstead operators
+_CLOSING_BRACKETS = (")", "]", "}")
+
+# Issue type keywords -> issue distribution category (first match wins)
+_ISSUE_CATEGORIES = (
+    (("secur", "vulnerab", "injection", "xss", "csrf"), "security_vulnerabilities"),
+    (("perform", "efficien", "complexity"), "performance_issues"),
+    (("smell", "maintainab", "readab", "style", "duplicat"), "code_smells"),
+    (("practice", "convention", "pep"), "best_practices"),
+)
+
+# Issue type keywords counted towards bug_density
+_BUG_KEYWORDS = ("bug", "error", "exception", "logic", "runtime", "crash")
+
+# Score deductions per issue severity
+_QUALITY_PENALTIES = {"critical": 20, "high": 10, "medium": 5, "low": 2}
+_SECURITY_PENALTIES = {"critical": 40, "high": 25, "medium": 10, "low": 5}
+
+
+def _own_nodes(node: ast.AST):
+    """Walk a node's subtree without descending into nested functions or classes."""
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, _FUNCTION_NODES + (ast.ClassDef, ast.Lambda)):
+            continue
+        yield child
+        yield from _own_nodes(child)
+
+
+def _cyclomatic_complexity(node: ast.AST) -> int:
+    """McCabe complexity of the code directly inside `node`."""
+    complexity = 1
+    for child in _own_nodes(node):
+        if isinstance(child, _DECISION_NODES):
+            complexity += 1
+        elif isinstance(child, ast.BoolOp):
+            complexity += len(child.values) - 1
+        elif isinstance(child, ast.comprehension):
+            complexity += 1 + len(child.ifs)
+    return complexity
+
+
+def _nesting_depth(statements: List[ast.stmt]) -> int:
+    """Deepest control-flow block nesting among `statements`, ignoring nested definitions."""
+    deepest = 0
+    for statement in statements:
+        if isinstance(statement, _FUNCTION_NODES + (ast.ClassDef,)):
+            continue
+        orelse = getattr(statement, "orelse", None) or []
+        chained = []
+        if isinstance(statement, ast.If) and len(orelse) == 1 and isinstance(orelse[0], ast.If) \
+                and orelse[0].col_offset == statement.col_offset:
+            # An elif (which starts in the if's own column, unlike an if inside
+            # an else block) continues the same if statement rather than nesting inside it
+            chained, orelse = orelse, []
+        children = list(getattr(statement, "body", None) or []) + orelse + list(getattr(statement, "finalbody", None) or [])
+        for handler in getattr(statement, "handlers", None) or []:
+            children.extend(handler.body)
+        for case in getattr(statement, "cases", None) or []:
+            children.extend(case.body)
+        depth = _nesting_depth(children)
+        if isinstance(statement, _BLOCK_NODES):
+            depth += 1
+        deepest = max(deepest, depth, _nesting_depth(chained))
+    return deepest
+
+
+def _function_metrics(tree: ast.Module) -> List[Dict]:
+    """Length, complexity and nesting of every function and method, in source order."""
+    functions = []
+
+    def _visit(node: ast.AST, prefix: str) -> None:
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, _FUNCTION_NODES):
+                start = min([child.lineno] + [decorator.lineno for decorator in child.decorator_list])
+                functions.append({
+                    "name": prefix + child.name,
+                    "line_number": child.lineno,
+                    "length": child.end_lineno - start + 1,
+                    "cyclomatic_complexity": _cyclomatic_complexity(child),
+                    "max_nesting_depth": _nesting_depth(child.body),
+                })
+                _visit(child, prefix + child.name + ".")
+            elif isinstance(child, ast.ClassDef):
+                _visit(child, prefix + child.name + ".")
+            else:
+                _visit(child, prefix)
+
+    _visit(tree, "")
+    return functions
+
+
+def _length_distribution(lengths: List[int]) -> Dict:
+    """Summary statistics and bucket counts of function lengths."""
+    buckets = {label: 0 for _, label in _LENGTH_BUCKETS}
+    for length in lengths:
+        for bound, label in _LENGTH_BUCKETS:
+            if bound is None or length <= bound:
+                buckets[label] += 1
+                break
+    return {
+        "count": len(lengths),
+        "min": min(lengths) if lengths else 0,
+        "max": max(lengths) if lengths else 0,
+        "mean": round(statistics.mean(lengths), 2) if lengths else 0.0,
+        "median": statistics.median(lengths) if lengths else 0,
+        "buckets": buckets,
+    }
+
+
+def _scan_tokens(code: str) -> Optional[Dict]:
+    """Line counts and Halstead measures from the token stream, or None if it cannot be tokenized."""
+    operators: Dict[str, int] = {}
+    operands: Dict[str, int] = {}
+    code_lines = set()
+    comment_lines = set()
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type == tokenize.COMMENT:
+                comment_lines.add(token.start[0])
+                continue
+            if token.type in (tokenize.NL, tokenize.NEWLINE, tokenize.INDENT,
+                              tokenize.DEDENT, tokenize.ENDMARKER):
+                continue
+            code_lines.update(range(token.start[0], token.end[0] + 1))
+            if token.type == tokenize.OP:
+                if token.string not in _CLOSING_BRACKETS:
+                    operators[token.string] = operators.get(token.string, 0) + 1
+            elif token.type == tokenize.NAME and keyword.iskeyword(token.string):
+                operators[token.string] = operators.get(token.string, 0) + 1
+            else:
+                operands[token.string] = operands.get(token.string, 0) + 1
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return None
+
+    distinct_operators, distinct_operands = len(operators), len(operands)
+    total_operators, total_operands = sum(operators.values()), sum(operands.values())
+    vocabulary = distinct_operators + distinct_operands
+    length = total_operators + total_operands
+    volume = length * math.log2(vocabulary) if vocabulary > 1 else 0.0
+    difficulty = (distinct_operators / 2) * (total_operands / distinct_operands) if distinct_operands else 0.0
+    return {
+        "source_lines": len(code_lines),
+        "comment_lines": len(comment_lines - code_lines),
+        "halstead": {
+            "distinct_operators": distinct_operators,
+            "distinct_operands": distinct_operands,
+            "total_operators": total_operators,
+            "total_operands": total_operands,
+            "vocabulary": vocabulary,
+            "length": length,
+            "volume": round(volume, 2),
+            "difficulty": round(difficulty, 2),
+            "effort": round(difficulty * volume, 2),
+            "estimated_bugs": round(volume / 3000, 3),
+        },
+    }
+
+
+def _maintainability_index(volume: float, complexity: int, source_lines: int) -> float:
+    """Maintainability index normalized to 0-100 (higher is better)."""
+    if source_lines == 0:
+        return 100.0
+    raw = 171 - 5.2 * math.log(max(volume, 1)) - 0.23 * complexity - 16.2 * math.log(source_lines)
+    return round(max(0.0, min(100.0, raw * 100 / 171)), 2)
+
+
+def compute_static_metrics(code_snippet: str) -> Dict:
+    """
+    Compute deterministic metrics for Python source.
+
+    Args:
+        code_snippet (str): The code to measure.
+
+    Returns:
+        dict: 'lines' (total/source/comment/blank), 'cyclomatic_complexity'
+              (total/average/max), 'max_nesting_depth', 'halstead',
+              'function_lengths', 'functions', 'maintainability_index' and
+              'syntax_error'. Measures that need a parse tree are None when the
+              code is not valid Python; 'syntax_error' then describes why.
+    """
+    lines = code_snippet.split("\n")
+    total_lines = len(lines)
+    blank_lines = sum(1 for line in lines if not line.strip())
+
+    scanned = _scan_tokens(code_snippet)
+    if scanned is None:
+        comment_lines = sum(1 for line in lines if line.strip().startswith("#"))
+        source_lines = total_lines - blank_lines - comment_lines
+    else:
+        comment_lines = scanned["comment_lines"]
+        source_lines = scanned["source_lines"]
+
+    metrics = {
+        "lines": {
+            "total": total_lines,
+            "source": source_lines,
+            "comment": comment_lines,
+            "blank": total_lines - source_lines - comment_lines,
+        },
+        "cyclomatic_complexity": None,
+        "max_nesting_depth": None,
+        "halstead": scanned["halstead"] if scanned else None,
+        "function_lengths": None,
+        "functions": None,
+        "maintainability_index": None,
+        "syntax_error": None,
+    }
+
+    try:
+        tree = ast.parse(code_snippet)
+    except (SyntaxError, ValueError) as e:
+        line = getattr(e, "lineno", None)
+        metrics["syntax_error"] = f"{getattr(e, 'msg', str(e))} (line {line})" if line else str(e)
+        return metrics
+
+    functions = _function_metrics(tree)
+    module_complexity = _cyclomatic_complexity(tree)
+    complexities = [function["cyclomatic_complexity"] for function in functions]
+    total_complexity = module_complexity + sum(complexities)
+    metrics.update({
+        "cyclomatic_complexity": {
+            "total": total_complexity,
+            "average": round(statistics.mean(complexities), 2) if complexities else float(module_complexity),
+            "max": max(complexities + [module_complexity]),
+        },
+        "max_nesting_depth": max(
+            [_nesting_depth(tree.body)] + [function["max_nesting_depth"] for function in functions]
+        ),
+        "function_lengths": _length_distribution([function["length"] for function in functions]),
+        "functions": functions,
+        "maintainability_index": _maintainability_index(
+            metrics["halstead"]["volume"] if metrics["halstead"] else 0.0, total_complexity, source_lines
+        ),
+    })
+    return metrics
+
+
+def metrics_from_issues(issues: List[Dict]) -> Dict:
+    """
+    Aggregate analysis issues into the summary metrics and issue distribution
+    that the metrics prompt asks the model for.
+
+    Issues are categorized by keywords in their 'type'. Scores start at 100 and
+    lose a fixed number of points per issue by severity (security_rating only
+    counts security issues).
+
+    Args:
+        issues (list): Issues as returned by analyze_code.
+
+    Returns:
+        dict: 'summary_metrics' and 'issue_distribution'.
+    """
+    distribution = {category: 0 for _, category in _ISSUE_CATEGORIES}
+    bug_count = 0
+    critical_count = 0
+    quality_score = 100
+    security_score = 100
+    for issue in issues:
+        if not isinstance(issue, dict):
+            continue
+        issue_type = str(issue.get("type", "")).lower()
+        severity = str(issue.get("severity", "")).lower()
+        category = next(
+            (name for keywords, name in _ISSUE_CATEGORIES if any(word in issue_type for word in keywords)), None
+        )
+        if category:
+            distribution[category] += 1
+        if any(word in issue_type for word in _BUG_KEYWORDS):
+            bug_count += 1
+        if severity == "critical":
+            critical_count += 1
+        quality_score -= _QUALITY_PENALTIES.get(severity, 0)
+        if category == "security_vulnerabilities":
+            security_score -= _SECURITY_PENALTIES.get(severity, 0)
+    return {
+        "summary_metrics": {
+            "code_quality_score": max(quality_score, 0),
+            "security_rating": max(security_score, 0),
+            "bug_density": bug_count,
+            "critical_issue_count": critical_count,
+        },
+        "issue_distribution": distribution,
+    }
@@ -0,0 +1,368 @@
+"""
+Local bug injection.
+Injects well-known bug types into Python source by mutating statements found
+with `ast`, without a model call. Mutations are applied as line edits
+(app.edits), so the rest of the file keeps its formatting and comments.
+"""
+
+import ast
+import hashlib
+import random
+import re
+from typing import Dict, List, Optional
+
+from app.edits import apply_edits
+
+# Bug type phrases (matched in the lowercased request) -> mutation kind
+_BUG_TYPE_ALIASES = (
+    (("division by zero", "divide by zero", "zero division", "zerodivision"), "division_by_zero"),
+    (("off-by-one", "off by one"), "off_by_one"),
+    (("inverted condition", "negated condition", "wrong condition", "logic error", "logical error"), "inverted_condition"),
+    (("sql injection", "sql string concatenation", "sql concatenation"), "sql_concatenation"),
+    (("swallowed exception", "exception swallowing", "silent exception", "swallowing exception"), "swallowed_exception"),
+    (("none dereference", "null dereference", "null pointer", "none reference"), "none_dereference"),
+    (("resource leak", "file leak", "file handle leak", "unclosed file", "unclosed resource"), "resource_leak"),
+)
+
+# Placeholders of DB-API parameterized queries
+_SQL_PLACEHOLDER = re.compile(r"\?|%s")
+
+# Comparison operators, their source text and their negation
+_COMPARE_TEXT = {
+    ast.Eq: "==", ast.NotEq: "!=", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=",
+    ast.Is: "is", ast.IsNot: "is not", ast.In: "in", ast.NotIn: "not in",
+}
+_NEGATED = {
+    ast.Eq: ast.NotEq, ast.NotEq: ast.Eq, ast.Lt: ast.GtE, ast.GtE: ast.Lt, ast.Gt: ast.LtE, ast.LtE: ast.Gt,
+    ast.Is: ast.IsNot, ast.IsNot: ast.Is, ast.In: ast.NotIn, ast.NotIn: ast.In,
+}
+# Boundary shifts for off-by-one comparisons
+_LOOSENED = {ast.Lt: ast.LtE, ast.LtE: ast.Lt, ast.Gt: ast.GtE, ast.GtE: ast.Gt}
+
+# Expressions whose source can be spliced into any other expression without parentheses
+_ATOMIC_NODES = (
+    ast.Name, ast.Constant, ast.Attribute, ast.Subscript, ast.Call, ast.List, ast.Dict, ast.Set,
+    ast.ListComp, ast.DictComp, ast.SetComp, ast.GeneratorExp, ast.JoinedStr,
+)
+# Expressions that bind more loosely than a comparison
+_LOOSER_THAN_COMPARE = (ast.BoolOp, ast.Compare, ast.IfExp, ast.Lambda, ast.NamedExpr)
+
+
+def mutation_kind(bug_type: str) -> Optional[str]:
+    """The local mutation kind implementing a requested bug type, or None if there is none."""
+    normalized = " ".join(re.split(r"[\s_]+", bug_type.lower()))
+    for phrases, kind in _BUG_TYPE_ALIASES:
+        if any(phrase in normalized for phrase in phrases):
+            return kind
+    return None
+
+
+def _char_col(line: str, byte_col: int) -> int:
+    """Convert an ast UTF-8 byte offset into a character offset."""
+    return len(line.encode("utf-8")[:byte_col].decode("utf-8", errors="ignore"))
+
+
+def _single_line(node: ast.AST) -> bool:
+    return node.lineno == node.end_lineno
+
+
+def _text(lines: List[str], node: ast.AST) -> str:
+    """Source text of a single-line node."""
+    line = lines[node.lineno - 1]
+    return line[_char_col(line, node.col_offset):_char_col(line, node.end_col_offset)]
+
+
+def _operand(lines: List[str], node: ast.AST) -> str:
+    """Source text of a single-line node, parenthesized unless it is atomic, for use as an operand."""
+    text = _text(lines, node)
+    return text if isinstance(node, _ATOMIC_NODES) else f"({text})"
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _replace_node(lines: List[str], node: ast.AST, text: str, description: str) -> Dict:
+    """Edit replacing a single-line node's source text."""
+    line = lines[node.lineno - 1]
+    start, end = _char_col(line, node.col_offset), _char_col(line, node.end_col_offset)
+    return {
+        "line_start": node.lineno,
+        "line_end": node.lineno,
+        "original": line,
+        "replacement": line[:start] + text + line[end:],
+        "description": description,
+    }
+
+
+def _replace_lines(lines: List[str], first: int, last: int, replacement: str, description: str) -> Dict:
+    """Edit replacing original lines first..last (1-based, inclusive)."""
+    return {
+        "line_start": first,
+        "line_end": last,
+        "original": "\n".join(lines[first - 1:last]),
+        "replacement": replacement,
+        "description": description,
+    }
+
+
+def _compare_text(lines: List[str], node: ast.Compare, op: type) -> str:
+    def side(operand: ast.AST) -> str:
+        loose = isinstance(operand, _LOOSER_THAN_COMPARE) or (
+            isinstance(operand, ast.UnaryOp) and isinstance(operand.op, ast.Not)
+        )
+        return f"({_text(lines, operand)})" if loose else _text(lines, operand)
+
+    return f"{side(node.left)} {_COMPARE_TEXT[op]} {side(node.comparators[0])}"
+
+
+def _division_by_zero(tree: ast.AST, lines: List[str], severity: int) -> List[Dict]:
+    """Divisors replaced by a literal zero (severity 4-5) or by an expression that is always zero."""
+    mutations = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Div, ast.FloorDiv)):
+            divisor = node.right
+        elif isinstance(node, ast.AugAssign) and isinstance(node.op, (ast.Div, ast.FloorDiv)):
+            divisor = node.value
+        else:
+            continue
+        if not _single_line(divisor) or (isinstance(divisor, ast.Constant) and divisor.value == 0):
+            continue
+        text = _text(lines, divisor)
+        operand = _operand(lines, divisor)
+        mutations.append(_replace_node(
+            lines, divisor, "0" if severity >= 4 else f"({operand} - {operand})",
+            f"The divisor '{text}' now always evaluates to zero, raising ZeroDivisionError."
+        ))
+    return mutations
+
+
+def _off_by_one(tree: ast.AST, lines: List[str], severity: int) -> List[Dict]:
+    """range() stops moved by one (past the end for severity 3-5, skipping the last item below) and shifted comparison boundaries."""
+    mutations = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "range" \
+                and 1 <= len(node.args) <= 2 and _single_line(node.args[-1]):
+            stop = _text(lines, node.args[-1])
+            operand = _operand(lines, node.args[-1])
+            if severity >= 3:
+                text, effect = f"{operand} + 1", "one past the end, which can raise IndexError"
+            else:
+                text, effect = f"{operand} - 1", "one short, so the last item is skipped"
+            mutations.append(_replace_node(
+                lines, node.args[-1], text, f"The loop bound '{stop}' was changed to '{text}': it now runs {effect}."
+            ))
+        elif isinstance(node, (ast.If, ast.While)) and isinstance(node.test, ast.Compare) \
+                and len(node.test.ops) == 1 and type(node.test.ops[0]) in _LOOSENED and _single_line(node.test):
+            op = type(node.test.ops[0])
+            mutations.append(_replace_node(
+                lines, node.test, _compare_text(lines, node.test, _LOOSENED[op]),
+                f"The boundary check uses '{_COMPARE_TEXT[_LOOSENED[op]]}' instead of '{_COMPARE_TEXT[op]}', "
+                "so the edge value is handled incorrectly."
+            ))
+    return mutations
+
+
+def _inverted_condition(tree: ast.AST, lines: List[str], severity: int) -> List[Dict]:
+    """Branch and loop conditions negated (severity 3-5) or with their comparison operator flipped."""
+    mutations = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.If, ast.While, ast.IfExp)) or not _single_line(node.test):
+            continue
+        test = node.test
+        original = _text(lines, test)
+        if isinstance(test, ast.UnaryOp) and isinstance(test.op, ast.Not):
+            text = _text(lines, test.operand)
+        elif severity < 3 and isinstance(test, ast.Compare) and len(test.ops) == 1:
+            text = _compare_text(lines, test, _NEGATED[type(test.ops[0])])
+        else:
+            text = f"not ({original})"
+        mutations.append(_replace_node(
+            lines, test, text, f"The condition '{original}' was inverted, so the wrong branch runs."
+        ))
+    return mutations
+
+
+def _sql_concatenation(tree: ast.AST, lines: List[str], severity: int) -> List[Dict]:
+    """Parameterized execute() calls rewritten to concatenate the parameters into the SQL text."""
+    mutations = []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr == "execute" and len(node.args) == 2 and _single_line(node)):
+            continue
+        query, params = node.args
+        if not (isinstance(query, ast.Constant) and isinstance(query.value, str)
+                and isinstance(params, (ast.Tuple, ast.List))):
+            continue
+        parts = _SQL_PLACEHOLDER.split(query.value)
+        if len(parts) - 1 != len(params.elts) or not params.elts:
+            continue
+        # Every value is wrapped in quotes, as a hand-written concatenation would do
+        literals = [("'" if i else "") + part + ("'" if i < len(parts) - 1 else "") for i, part in enumerate(parts)]
+        pieces = [repr(literals[0])]
+        for value, literal in zip(params.elts, literals[1:]):
+            pieces.append(f"str({_text(lines, value)})")
+            pieces.append(repr(literal))
+        mutations.append(_replace_node(
+            lines, node, f"{_text(lines, node.func)}({' + '.join(pieces)})",
+            "Query parameters are concatenated into the SQL statement instead of being bound, allowing SQL injection."
+        ))
+    return mutations
+
+
+def _swallowed_exception(tree: ast.AST, lines: List[str], severity: int) -> List[Dict]:
+    """Exception handler bodies replaced by 'pass'; severity 4-5 also widens the handler to every Exception."""
+    mutations = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.ExceptHandler):
+            continue
+        if len(node.body) == 1 and isinstance(node.body[0], ast.Pass):
+            continue
+        body_indent = _indent(lines[node.body[0].lineno - 1])
+        if severity >= 4 and node.type is not None and node.body[0].lineno == node.lineno + 1:
+            header = lines[node.lineno - 1]
+            name = f" as {node.name}" if node.name else ""
+            mutations.append(_replace_lines(
+                lines, node.lineno, node.body[-1].end_lineno,
+                f"{_indent(header)}except Exception{name}:\n{body_indent}pass",
+                "Every exception is now caught and silently ignored, hiding failures."
+            ))
+        elif node.body[0].lineno > node.lineno:
+            mutations.append(_replace_lines(
+                lines, node.body[0].lineno, node.body[-1].end_lineno, f"{body_indent}pass",
+                "The exception handler silently ignores the error instead of handling it."
+            ))
+    return mutations
+
+
+def _none_dereference(tree: ast.AST, lines: List[str], severity: int) -> List[Dict]:
+    """
+    Values that are dereferenced later made None: assignments from a call set to
+    None (severity 4-5), or subscripts turned into .get() lookups that return None.
+    """
+    dereferenced = {
+        (node.value.id, node.lineno) for node in ast.walk(tree)
+        if isinstance(node, (ast.Attribute, ast.Subscript)) and isinstance(node.value, ast.Name)
+    }
+    mutations = []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name) and _single_line(node)):
+            continue
+        name = node.targets[0].id
+        if not any(used == name and line > node.lineno for used, line in dereferenced):
+            continue
+        value = node.value
+        if severity >= 4 and isinstance(value, ast.Call):
+            mutations.append(_replace_node(
+                lines, value, "None", f"'{name}' is set to None and later dereferenced, raising AttributeError or TypeError."
+            ))
+        elif isinstance(value, ast.Subscript) and not isinstance(value.slice, ast.Slice):
+            text = f"{_operand(lines, value.value)}.get({_text(lines, value.slice)})"
+            mutations.append(_replace_node(
+                lines, value, text, f"'{name}' becomes None when the key is missing and is later dereferenced."
+            ))
+    return mutations
+
+
+def _resource_leak(tree: ast.AST, lines: List[str], severity: int) -> List[Dict]:
+    """'with' blocks replaced by a plain assignment that is never closed, and explicit close() calls removed."""
+    mutations = []
+    # Statements that make up a whole block on their own, which cannot be left empty
+    sole_statements = {
+        id(block[0]) for parent in ast.walk(tree)
+        for block in (getattr(parent, field, None) for field in ("body", "orelse", "finalbody"))
+        if isinstance(block, list) and len(block) == 1
+    }
+    for node in ast.walk(tree):
+        if isinstance(node, ast.With) and len(node.items) == 1 \
+                and isinstance(node.items[0].optional_vars, ast.Name) and isinstance(node.items[0].context_expr, ast.Call) \
+                and _single_line(node.items[0].context_expr) and node.body[0].lineno == node.lineno + 1:
+            header_indent = _indent(lines[node.lineno - 1])
+            body_indent = _indent(lines[node.body[0].lineno - 1])
+            extra = body_indent[len(header_indent):]
+            body = lines[node.body[0].lineno - 1:node.end_lineno]
+            if not extra or not body_indent.startswith(header_indent) \
+                    or not all(line.startswith(body_indent) or not line.strip() for line in body):
+                continue
+            target = node.items[0].optional_vars.id
+            dedented = [line[len(extra):] if line.strip() else line for line in body]
+            mutations.append(_replace_lines(
+                lines, node.lineno, node.end_lineno,
+                "\n".join([f"{header_indent}{target} = {_text(lines, node.items[0].context_expr)}"] + dedented),
+                f"'{target}' is no longer opened in a 'with' block and is never closed, leaking the resource."
+            ))
+        elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) and _single_line(node) \
+                and isinstance(node.value.func, ast.Attribute) and node.value.func.attr == "close" and not node.value.args \
+                and lines[node.lineno - 1].strip() == _text(lines, node):
+            target = _text(lines, node.value.func.value)
+            replacement = f"{_indent(lines[node.lineno - 1])}pass" if id(node) in sole_statements else ""
+            mutations.append(_replace_lines(
+                lines, node.lineno, node.lineno, replacement,
+                f"'{target}' is never closed, leaking the resource."
+            ))
+    return mutations
+
+
+_MUTATORS = {
+    "division_by_zero": _division_by_zero,
+    "off_by_one": _off_by_one,
+    "inverted_condition": _inverted_condition,
+    "sql_concatenation": _sql_concatenation,
+    "swallowed_exception": _swallowed_exception,
+    "none_dereference": _none_dereference,
+    "resource_leak": _resource_leak,
+}
+
+
+def inject_local_bugs(code_snippet: str, bug_type: str, severity_level: int, num_bugs: int,
+                      seed: str = "") -> Optional[Dict]:
+    """
+    Inject bugs of a well-known type without calling the model.
+
+    Candidate sites are chosen pseudo-randomly but reproducibly from the code,
+    the parameters and `seed`, without overlapping each other.
+
+    Args:
+        code_snippet (str): Python source code.
+        bug_type (str): Requested bug type; see mutation_kind.
+        severity_level (int): 1-5; higher levels pick more disruptive variants.
+        num_bugs (int): Number of bugs to inject.
+        seed (str): Extra input for choosing sites, to get different variants.
+
+    Returns:
+        dict: 'buggy_code' and 'bugs_injected' like inject_bugs, or None if the
+              bug type is not supported, the code does not parse or it has
+              fewer than `num_bugs` places to inject the bug.
+    """
+    kind = mutation_kind(bug_type)
+    if kind is None:
+        return None
+    try:
+        tree = ast.parse(code_snippet)
+    except (SyntaxError, ValueError):
+        return None
+    lines = code_snippet.split("\n")
+    candidates = _MUTATORS[kind](tree, lines, severity_level)
+
+    rng = random.Random(hashlib.sha256(
+        f"{code_snippet}\0{kind}\0{severity_level}\0{num_bugs}\0{seed}".encode("utf-8")
+    ).hexdigest())
+    rng.shuffle(candidates)
+    chosen = []
+    for mutation in candidates:
+        if all(mutation["line_end"] < other["line_start"] or other["line_end"] < mutation["line_start"] for other in chosen):
+            chosen.append({**mutation, "type": bug_type})
+            if len(chosen) == num_bugs:
+                break
+    if len(chosen) < num_bugs:
+        return None
+
+    buggy_code, bugs, skipped = apply_edits(code_snippet, chosen)
+    try:
+        ast.parse(buggy_code)
+    except SyntaxError:
+        return None
+    if skipped:
+        return None
+    return {"buggy_code": buggy_code, "bugs_injected": bugs}
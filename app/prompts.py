@@ -0,0 +1,114 @@
+"""
+Prompt templates for the Gemini-backed services.
+Built once at import time and shared by every request.
+"""
+
+import json
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.schemas import (
+    AnalysisOutput, InjectionEditsOutput, InjectionEditsVariantsOutput, InjectionOutput, InjectionVariantsOutput,
+    MetricsOutput, ReportOutput, ReportWithInjectionOutput,
+)
+
+# Bump whenever a template changes so cached results from older prompts are not reused
+PROMPT_VERSION = "5"
+
+# Appended to prompts whose reply is validated against a schema from app.schemas
+_SCHEMA_INSTRUCTIONS = "\n\nRespond with only a JSON object that conforms to this JSON schema:\n{output_schema}"
+
+
+def _schema_text(model) -> str:
+    """Compact JSON schema of a pydantic model, for embedding in a prompt."""
+    return json.dumps(model.model_json_schema(), separators=(",", ":"))
+
+ANALYZE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant that analyzes code for potential issues and returns the analysis in a structured JSON format."),
+    ("human", "Analyze the following code snippet for potential issues. \nProvide the analysis in a structured JSON format, including 'title', 'type', 'severity' (e.g., 'Low', 'Medium', 'High', 'Critical'), 'lineNumber', 'description', and 'suggestedFix' for each issue found.\n\nCode:\n```python\n{code_snippet}\n```\n\nExample JSON format for issues:\n{{\"issues\": [{{\"title\": \"Issue Title\", \"type\": \"Bug\", \"severity\": \"High\", \"lineNumber\": 10, \"description\": \"Detailed description of the issue.\", \"suggestedFix\": \"Recommended fix for the issue.\"}}]}}\n\nThe following issues were already found by static checks and are reported separately. Do not include them in your output:\n{known_issues}" + _SCHEMA_INSTRUCTIONS)
+]).partial(output_schema=_schema_text(AnalysisOutput))
+
+METRICS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant that analyzes code and provides summary metrics and issue distribution in a structured JSON format."),
+    ("human", """Analyze the following code snippet and provide the analysis in a structured JSON format. I need two main sections: 'summary_metrics' and 'issue_distribution'.\n\nFor 'summary_metrics', include:\n- 'code_quality_score' (an integer from 0-100 where higher is better)\n- 'security_rating' (an integer from 0-100 where higher is better)\n- 'bug_density' (count of bugs/runtime errors)\n- 'critical_issue_count' (count of critical severity issues)\n\nFor 'issue_distribution', include:\n- 'security_vulnerabilities' (count of security/vulnerability issues)\n- 'code_smells' (count of code smell issues)\n- 'best_practices' (count of best practice violations, if any)\n- 'performance_issues' (count of performance-related issues, if any)\n
+Ensure the output is a single JSON object. Here's an example of the desired JSON format:\n```json\n{{\n  \"summary_metrics\": {{\n    \"code_quality_score\": 85,\n    \"security_rating\": 90,\n    \"bug_density\": 1,\n    \"critical_issue_count\": 0\n  }},\n  \"issue_distribution\": {{\n    \"security_vulnerabilities\": 0,\n    \"code_smells\": 2,\n    \"best_practices\": 1,\n    \"performance_issues\": 0\n  }}\n}}\n```\n
+Code:\n```python\n{code_snippet}\n```""" + _SCHEMA_INSTRUCTIONS)
+]).partial(output_schema=_schema_text(MetricsOutput))
+
+INJECT_BUGS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant that injects bugs into code based on given parameters and returns the modified code and bug details in JSON format."),
+    ("human", """Inject {num_bugs} bugs of type '{bug_type}' with severity level {severity_level} into the following Python code snippet.\nProvide the output in a structured JSON format with two keys: 'buggy_code' (containing the full modified code) and 'bugs_injected' (an array of objects, where each object describes an injected bug with 'type', 'line_number', and 'description').\n\nCode:\n```python\n{code_snippet}\n```\n\nExample JSON format:\n{{\n  "buggy_code": "def example_function():\n    # Some example code without further template variables\n    return 0",\n  "bugs_injected": [\n    {{\n      "type": "{bug_type}", "line_number": 2, "description": "Description of the injected bug."\n    }}\n  ]\n}}\n""" + _SCHEMA_INSTRUCTIONS)
+]).partial(output_schema=_schema_text(InjectionOutput))
+
+INJECT_BUGS_EDITS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant that injects bugs into code based on given parameters and returns only the changed lines as edits in JSON format."),
+    ("human", """Inject {num_bugs} bugs of type '{bug_type}' with severity level {severity_level} into the following Python code snippet.\nEvery line is prefixed with its line number and '| ', which are not part of the code.\nDo not return the full modified code. Return a JSON object with one key, 'edits': an array with one object per injected bug containing 'line_start' and 'line_end' (the first and last line numbers replaced, inclusive), 'original' (the exact text of those lines, without the number prefixes), 'replacement' (the new text for those lines, keeping their indentation; may span more or fewer lines), 'type' and 'description'. Keep every edit as small as possible and do not let edits overlap.\n\nCode:\n```\n{numbered_code}\n```\n\nExample JSON format:\n{{\n  "edits": [\n    {{\n      "line_start": 2, "line_end": 2, "original": "    return a / b", "replacement": "    return a / (b - b)", "type": "{bug_type}", "description": "Description of the injected bug."\n    }}\n  ]\n}}\n""" + _SCHEMA_INSTRUCTIONS)
+]).partial(output_schema=_schema_text(InjectionEditsOutput))
+
+INJECT_BUGS_VARIANTS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant that injects bugs into code based on given parameters and returns several independent buggy versions and their bug details in JSON format."),
+    ("human", """Create {num_variants} independent buggy versions of the following Python code snippet. In each version, inject {num_bugs} bugs of type '{bug_type}' with severity level {severity_level} into the original code. The versions must differ from each other: put the bugs in different places or make different mistakes.
+Provide the output in a structured JSON format with one key, 'variants': an array with one object per version containing 'buggy_code' (the full modified code) and 'bugs_injected' (an array of objects, where each object describes an injected bug with 'type', 'line_number', and 'description').
+
+Code:
+```python
+{code_snippet}
+```
+
+Example JSON format:
+{{
+  "variants": [
+    {{
+      "buggy_code": "def example_function():
+    # Some example code without further template variables
+    return 0",
+      "bugs_injected": [
+        {{
+          "type": "{bug_type}", "line_number": 2, "description": "Description of the injected bug."
+        }}
+      ]
+    }}
+  ]
+}}
+""" + _SCHEMA_INSTRUCTIONS)
+]).partial(output_schema=_schema_text(InjectionVariantsOutput))
+
+INJECT_BUGS_EDITS_VARIANTS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant that injects bugs into code based on given parameters and returns several independent buggy versions as edits in JSON format."),
+    ("human", """Create {num_variants} independent buggy versions of the following Python code snippet. In each version, inject {num_bugs} bugs of type '{bug_type}' with severity level {severity_level} into the original code. The versions must differ from each other: put the bugs in different places or make different mistakes.
+Every line is prefixed with its line number and '| ', which are not part of the code.
+Do not return the full modified code. Return a JSON object with one key, 'variants': an array with one object per version containing 'edits': an array with one object per injected bug containing 'line_start' and 'line_end' (the first and last line numbers of the original code replaced, inclusive), 'original' (the exact text of those lines, without the number prefixes), 'replacement' (the new text for those lines, keeping their indentation; may span more or fewer lines), 'type' and 'description'. Keep every edit as small as possible and do not let the edits of a version overlap.
+
+Code:
+```
+{numbered_code}
+```
+
+Example JSON format:
+{{
+  "variants": [
+    {{
+      "edits": [
+        {{
+          "line_start": 2, "line_end": 2, "original": "    return a / b", "replacement": "    return a / (b - b)", "type": "{bug_type}", "description": "Description of the injected bug."
+        }}
+      ]
+    }}
+  ]
+}}
+""" + _SCHEMA_INSTRUCTIONS)
+]).partial(output_schema=_schema_text(InjectionEditsVariantsOutput))
+
+REPORT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant that reviews code and returns issues, summary metrics and issue distribution together in a single structured JSON format."),
+    ("human", """Review the following code snippet and provide the result as a single JSON object with three keys: 'issues', 'summary_metrics' and 'issue_distribution'.\n\nFor 'issues', list every potential issue found with 'title', 'type', 'severity' (e.g., 'Low', 'Medium', 'High', 'Critical'), 'lineNumber', 'description', and 'suggestedFix'.\n\nFor 'summary_metrics', include:\n- 'code_quality_score' (an integer from 0-100 where higher is better)\n- 'security_rating' (an integer from 0-100 where higher is better)\n- 'bug_density' (count of bugs/runtime errors)\n- 'critical_issue_count' (count of critical severity issues)\n\nFor 'issue_distribution', include:\n- 'security_vulnerabilities' (count of security/vulnerability issues)\n- 'code_smells' (count of code smell issues)\n- 'best_practices' (count of best practice violations, if any)\n- 'performance_issues' (count of performance-related issues, if any)\n\nThe metrics and distribution must be consistent with the issues listed.\n\nThe following issues were already found by static checks and are reported separately. Do not include them in 'issues', but do count them in the metrics and distribution:\n{known_issues}\n
+Code:\n```python\n{code_snippet}\n```\n
+Example JSON format:\n{{\"issues\": [{{\"title\": \"Issue Title\", \"type\": \"Bug\", \"severity\": \"High\", \"lineNumber\": 10, \"description\": \"Detailed description of the issue.\", \"suggestedFix\": \"Recommended fix for the issue.\"}}], \"summary_metrics\": {{\"code_quality_score\": 85, \"security_rating\": 90, \"bug_density\": 1, \"critical_issue_count\": 0}}, \"issue_distribution\": {{\"security_vulnerabilities\": 0, \"code_smells\": 2, \"best_practices\": 1, \"performance_issues\": 0}}}}""" + _SCHEMA_INSTRUCTIONS)
+]).partial(output_schema=_schema_text(ReportOutput))
+
+REPORT_WITH_INJECTION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant that reviews code, then injects bugs into it, and returns both results together in a single structured JSON format."),
+    ("human", """Review the following code snippet and provide the result as a single JSON object with four keys: 'issues', 'summary_metrics', 'issue_distribution' and 'injection'.\n\nFor 'issues', list every potential issue found with 'title', 'type', 'severity' (e.g., 'Low', 'Medium', 'High', 'Critical'), 'lineNumber', 'description', and 'suggestedFix'.\n\nFor 'summary_metrics', include:\n- 'code_quality_score' (an integer from 0-100 where higher is better)\n- 'security_rating' (an integer from 0-100 where higher is better)\n- 'bug_density' (count of bugs/runtime errors)\n- 'critical_issue_count' (count of critical severity issues)\n\nFor 'issue_distribution', include:\n- 'security_vulnerabilities' (count of security/vulnerability issues)\n- 'code_smells' (count of code smell issues)\n- 'best_practices' (count of best practice violations, if any)\n- 'performance_issues' (count of performance-related issues, if any)\n\nThe metrics and distribution must be consistent with the issues listed. 'issues', 'summary_metrics' and 'issue_distribution' describe the original code.\n\nThe following issues were already found by static checks and are reported separately. Do not include them in 'issues', but do count them in the metrics and distribution:\n{known_issues}\n\nFor 'injection', inject {num_bugs} bugs of type '{bug_type}' with severity level {severity_level} into the original code and include 'buggy_code' (containing the full modified code) and 'bugs_injected' (an array of objects, where each object describes an injected bug with 'type', 'line_number', and 'description').\n
+Code:\n```python\n{code_snippet}\n```\n
+Example JSON format:\n{{\"issues\": [{{\"title\": \"Issue Title\", \"type\": \"Bug\", \"severity\": \"High\", \"lineNumber\": 10, \"description\": \"Detailed description of the issue.\", \"suggestedFix\": \"Recommended fix for the issue.\"}}], \"summary_metrics\": {{\"code_quality_score\": 85, \"security_rating\": 90, \"bug_density\": 1, \"critical_issue_count\": 0}}, \"issue_distribution\": {{\"security_vulnerabilities\": 0, \"code_smells\": 2, \"best_practices\": 1, \"performance_issues\": 0}}, \"injection\": {{\"buggy_code\": \"def example_function():\\n    return 0\", \"bugs_injected\": [{{\"type\": \"{bug_type}\", \"line_number\": 2, \"description\": \"Description of the injected bug.\"}}]}}}}""" + _SCHEMA_INSTRUCTIONS)
+]).partial(output_schema=_schema_text(ReportWithInjectionOutput))
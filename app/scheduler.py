@@ -0,0 +1,148 @@
+"""
+Concurrency limiting for upstream Gemini calls.
+Caps in-flight calls per API key and globally, queues excess calls for a
+bounded time and rejects them once the queue is full.
+"""
+
+import asyncio
+import hashlib
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+
+class OverloadedError(Exception):
+    """Raised when an upstream call cannot be scheduled; maps to HTTP 429."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Lane:
+    """Per-key semaphore plus the number of calls holding or waiting for it."""
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.users = 0
+
+
+class ConcurrencyLimiter:
+    """
+    Two-level scheduler for upstream calls.
+
+    A call first takes a slot in its API key's lane, then a global slot, so a
+    single tenant can occupy at most `per_key_limit` of the `global_limit`
+    upstream connections. Calls that cannot start immediately wait in a queue
+    bounded both per key and globally; a call that would exceed either bound,
+    or that waits longer than `max_wait` seconds, raises OverloadedError.
+    """
+
+    def __init__(self, global_limit: int = 32, per_key_limit: int = 4,
+                 max_queue: int = 64, max_queue_per_key: int = 16, max_wait: float = 30.0):
+        self.global_limit = global_limit
+        self.per_key_limit = per_key_limit
+        self.max_queue = max_queue
+        self.max_queue_per_key = max_queue_per_key
+        self.max_wait = max_wait
+        self._global = asyncio.Semaphore(global_limit)
+        self._lanes: Dict[str, _Lane] = {}
+        self._users = 0
+        self._waiting = 0
+        self._avg_call_seconds = 10.0
+
+    @staticmethod
+    def _lane_id(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+    def _retry_after(self, queued: int, slots: int) -> int:
+        """Estimate seconds until a slot frees up, from the average call duration."""
+        return max(1, math.ceil(self._avg_call_seconds * (queued + 1) / max(slots, 1)))
+
+    @asynccontextmanager
+    async def slot(self, api_key: str) -> AsyncIterator[None]:
+        """
+        Hold an upstream slot for the duration of the block.
+
+        Args:
+            api_key (str): API key the call is made with.
+
+        Raises:
+            OverloadedError: If the queue is full or the wait exceeds max_wait.
+        """
+        lane_id = self._lane_id(api_key)
+        lane = self._lanes.get(lane_id)
+        if lane is None:
+            lane = self._lanes[lane_id] = _Lane(self.per_key_limit)
+
+        # Admission is decided from counters, before the first await, so concurrent
+        # arrivals cannot all slip past the queue bound
+        if lane.users >= self.per_key_limit + self.max_queue_per_key:
+            self._release_lane(lane_id, lane)
+            raise OverloadedError(
+                "Too many queued requests for this API key. Retry later.",
+                self._retry_after(lane.users - self.per_key_limit, self.per_key_limit),
+            )
+        if self._users >= self.global_limit + self.max_queue:
+            self._release_lane(lane_id, lane)
+            raise OverloadedError(
+                "Server is at capacity. Retry later.",
+                self._retry_after(self._users - self.global_limit, self.global_limit),
+            )
+
+        lane.users += 1
+        self._users += 1
+        self._waiting += 1
+        deadline = time.monotonic() + self.max_wait
+        acquired_lane = acquired_global = False
+        try:
+            try:
+                await asyncio.wait_for(lane.semaphore.acquire(), timeout=self.max_wait)
+                acquired_lane = True
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    await asyncio.wait_for(self._global.acquire(), timeout=remaining)
+                elif self._global.locked():
+                    raise asyncio.TimeoutError()
+                else:
+                    # The lane wait used up the budget, but a free global slot needs no waiting
+                    await self._global.acquire()
+                acquired_global = True
+            except asyncio.TimeoutError:
+                raise OverloadedError(
+                    "Timed out waiting for an upstream slot. Retry later.",
+                    self._retry_after(self._waiting, self.global_limit),
+                )
+            finally:
+                self._waiting -= 1
+
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                elapsed = time.monotonic() - started
+                self._avg_call_seconds = 0.8 * self._avg_call_seconds + 0.2 * elapsed
+        finally:
+            if acquired_global:
+                self._global.release()
+            if acquired_lane:
+                lane.semaphore.release()
+            lane.users -= 1
+            self._users -= 1
+            self._release_lane(lane_id, lane)
+
+    def _release_lane(self, lane_id: str, lane: _Lane) -> None:
+        """Forget idle lanes so the table does not grow with every key ever seen."""
+        if lane.users == 0 and self._lanes.get(lane_id) is lane:
+            del self._lanes[lane_id]
+
+    def stats(self) -> dict:
+        """Snapshot of current load, for logging and health checks."""
+        return {
+            "active_keys": len(self._lanes),
+            "in_flight": self._users - self._waiting,
+            "queued": self._waiting,
+            "global_limit": self.global_limit,
+            "per_key_limit": self.per_key_limit,
+        }
@@ -0,0 +1,100 @@
+"""
+Schemas of the JSON the model is asked to return.
+Used by the routes to shape responses, by the prompts to describe the
+expected output and by the services to validate replies.
+"""
+
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class IssueDetail(BaseModel):
+    """Model for individual code issue."""
+    title: str
+    type: str
+    severity: str
+    lineNumber: Optional[int] = None
+    description: str
+    suggestedFix: str
+
+
+class SummaryMetrics(BaseModel):
+    """Model for code quality metrics."""
+    code_quality_score: int
+    security_rating: int
+    bug_density: int
+    critical_issue_count: int
+
+
+class IssueDistribution(BaseModel):
+    """Model for issue distribution."""
+    security_vulnerabilities: int
+    code_smells: int
+    best_practices: int
+    performance_issues: int
+
+
+class BugDetail(BaseModel):
+    """Model for individual injected bug."""
+    type: str
+    line_number: int
+    description: str
+
+
+class AnalysisOutput(BaseModel):
+    """Issues found in the code (reply to ANALYZE_PROMPT)."""
+    issues: List[IssueDetail]
+
+
+class MetricsOutput(BaseModel):
+    """Summary metrics and issue distribution of the code (reply to METRICS_PROMPT)."""
+    summary_metrics: SummaryMetrics
+    issue_distribution: IssueDistribution
+
+
+class ReportOutput(BaseModel):
+    """Issues, summary metrics and issue distribution of the code (reply to REPORT_PROMPT)."""
+    issues: List[IssueDetail]
+    summary_metrics: SummaryMetrics
+    issue_distribution: IssueDistribution
+
+
+class CodeEdit(BaseModel):
+    """One injected bug as a replacement of a range of original lines."""
+    line_start: int = Field(ge=1)
+    line_end: int = Field(ge=1)
+    original: str
+    replacement: str
+    type: str
+    description: str
+
+
+class InjectionEditsOutput(BaseModel):
+    """The injected bugs as line edits of the original code (reply to INJECT_BUGS_EDITS_PROMPT)."""
+    edits: List[CodeEdit] = Field(min_length=1)
+
+
+class InjectionOutput(BaseModel):
+    """The code with injected bugs and a description of each bug (reply to INJECT_BUGS_PROMPT)."""
+    buggy_code: str = Field(min_length=1)
+    bugs_injected: List[BugDetail] = Field(min_length=1)
+
+
+class ReportWithInjectionOutput(ReportOutput):
+    """A report plus a bug injection into the same code (reply to REPORT_WITH_INJECTION_PROMPT)."""
+    injection: InjectionOutput
+
+
+class InjectionVariantsOutput(BaseModel):
+    """Several independent injections into the same code (reply to INJECT_BUGS_VARIANTS_PROMPT)."""
+    variants: List[InjectionOutput] = Field(min_length=1)
+
+
+class InjectionEditsVariantsOutput(BaseModel):
+    """Several independent injections as line edits of the same code (reply to INJECT_BUGS_EDITS_VARIANTS_PROMPT)."""
+    variants: List[InjectionEditsOutput] = Field(min_length=1)
+
+
+class VariantsEnvelope(BaseModel):
+    """Outer shape of a multi-variant reply; each variant is validated on its own so one bad variant does not discard the rest."""
+    variants: List[dict] = Field(min_length=1)
@@ -4,14 +4,33 @@ Functions for analyzing code, calculating metrics, and injecting bugs.
 Exact logic from code_review.ipynb notebook.
 """
 
-import json
+import asyncio
 import os
 import logging
 from dotenv import load_dotenv
-import google.generativeai as genai
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from pydantic import ValidationError
+from app.api.routes_code_input import SNIPPET_SEPARATOR
+from app.compression import compress_code
+from app.edits import apply_edits, number_lines
+from app.chunking import chunk_source, chunks_for_ranges, split_definitions
+from app.cache import DiskCache, ResultCache, TieredCache, make_cache_key, normalize_code
+from app.llm import ClientPool
+from app.json_repair import parse_model_json
+from app.metrics import compute_static_metrics, metrics_from_issues
+from app.mutations import inject_local_bugs
+from app.prompts import (
+    ANALYZE_PROMPT, INJECT_BUGS_EDITS_PROMPT, INJECT_BUGS_EDITS_VARIANTS_PROMPT, INJECT_BUGS_PROMPT,
+    INJECT_BUGS_VARIANTS_PROMPT, METRICS_PROMPT, PROMPT_VERSION, REPORT_PROMPT, REPORT_WITH_INJECTION_PROMPT,
+)
+from app.scheduler import ConcurrencyLimiter
+from app.schemas import (
+    AnalysisOutput, InjectionEditsOutput, InjectionOutput, MetricsOutput, ReportOutput, ReportWithInjectionOutput,
+    VariantsEnvelope,
+)
+from app.singleflight import SingleFlight
+from app.static_checks import format_known_issues, merge_issues, run_static_checks
+from app.stream_parser import ArrayItemStreamParser
+from app.tokens import TokenBudgetError, estimate_prompt_tokens
 
 # Configure logging
 logging.basicConfig(
@@ -24,6 +43,78 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 DEFAULT_API_KEY = os.getenv("API_KEY")
 
+# Model identity - part of every cache key together with PROMPT_VERSION.
+# MODEL_NAME is the pro tier; small, simple inputs are routed to FAST_MODEL_NAME.
+MODEL_NAME = "gemini-2.5-pro"
+FAST_MODEL_NAME = os.getenv("FAST_MODEL_NAME", "gemini-2.5-flash")
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "true").lower() in ("1", "true", "yes")
+FAST_TIER_MAX_LINES = int(os.getenv("FAST_TIER_MAX_LINES", "60"))
+FAST_TIER_MAX_COMPLEXITY = int(os.getenv("FAST_TIER_MAX_COMPLEXITY", "10"))
+# Latency budgets (seconds) below this always use the fast tier
+PRO_TIER_MIN_LATENCY_SECONDS = float(os.getenv("PRO_TIER_MIN_LATENCY_SECONDS", "15"))
+
+# Chat clients reused across requests, one per API key and model
+client_pool = ClientPool(max_clients=int(os.getenv("LLM_CLIENT_POOL_SIZE", "16")))
+
+# Results of successful upstream calls, keyed by normalized code and parameters.
+# The disk tier survives restarts; set CACHE_DB_PATH to an empty string to disable it.
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "data/result_cache.sqlite3")
+result_cache = TieredCache(
+    memory=ResultCache(
+        max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "256")),
+        ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "3600")),
+    ),
+    disk=DiskCache(
+        CACHE_DB_PATH,
+        max_bytes=int(os.getenv("CACHE_DISK_MAX_BYTES", str(64 * 1024 * 1024))),
+        ttl_seconds=float(os.getenv("CACHE_DISK_TTL_SECONDS", str(7 * 24 * 3600))),
+        compact_interval=float(os.getenv("CACHE_COMPACT_INTERVAL_SECONDS", "600")),
+    ) if CACHE_DB_PATH else None,
+)
+
+# Caps in-flight upstream calls per API key and globally, queueing the excess
+upstream_limiter = ConcurrencyLimiter(
+    global_limit=int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "32")),
+    per_key_limit=int(os.getenv("UPSTREAM_MAX_CONCURRENCY_PER_KEY", "4")),
+    max_queue=int(os.getenv("UPSTREAM_MAX_QUEUE", "64")),
+    max_queue_per_key=int(os.getenv("UPSTREAM_MAX_QUEUE_PER_KEY", "16")),
+    max_wait=float(os.getenv("UPSTREAM_QUEUE_TIMEOUT_SECONDS", "30")),
+)
+
+# Coalesces concurrent cache misses for the same key into one upstream call
+single_flight = SingleFlight()
+
+# Maximum snippets of one batch request analyzed at the same time
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+
+# Sources longer than this are split into chunks of about CHUNK_MAX_LINES lines for analysis
+CHUNK_THRESHOLD_LINES = int(os.getenv("CHUNK_THRESHOLD_LINES", "300"))
+CHUNK_MAX_LINES = int(os.getenv("CHUNK_MAX_LINES", "150"))
+
+# Strip comments, docstrings and blank lines from code before prompting (overridable per request)
+PROMPT_COMPRESSION = os.getenv("PROMPT_COMPRESSION", "false").lower() in ("1", "true", "yes")
+
+# Aggregate code metrics from a cached analysis of the same code instead of asking the model
+METRICS_FROM_ANALYSIS = os.getenv("METRICS_FROM_ANALYSIS", "true").lower() in ("1", "true", "yes")
+
+# Validate replies against app.schemas and retry a non-conforming pro-tier reply once;
+# also requests the upstream JSON response mode where the SDK supports it
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+
+# Estimated prompt size (tokens) above which requests are chunked (analysis) or rejected
+MAX_INPUT_TOKENS = int(os.getenv("MAX_INPUT_TOKENS", "200000"))
+
+# Generation caps per endpoint (tokens, including the model's thinking)
+MAX_OUTPUT_TOKENS = {
+    "analyze_code": int(os.getenv("ANALYZE_MAX_OUTPUT_TOKENS", "16384")),
+    "get_code_metrics": int(os.getenv("METRICS_MAX_OUTPUT_TOKENS", "4096")),
+    "inject_bugs": int(os.getenv("INJECT_MAX_OUTPUT_TOKENS", "16384")),
+    "report": int(os.getenv("REPORT_MAX_OUTPUT_TOKENS", "32768")),
+}
+
+# Inject bug types known to app.mutations locally instead of asking the model (overridable per request)
+LOCAL_MUTATIONS = os.getenv("LOCAL_MUTATIONS", "true").lower() in ("1", "true", "yes")
+
 def get_api_key(user_api_key: str = None) -> str:
     """
     Get API key from user input or fall back to environment variable.
@@ -58,164 +149,916 @@ def get_api_key(user_api_key: str = None) -> str:
     raise ValueError(error_msg)
 
 
-def analyze_code(code_snippet: str, api_key: str = None):
+async def _serve_cached(cache_key: str, label: str, generate, fallback_keys: tuple = ()) -> dict:
+    """
+    Serve a result from the cache, or compute it once for all concurrent callers.
+
+    Args:
+        cache_key (str): Key identifying the request.
+        label (str): Human-readable name of the operation, for logging.
+        generate (callable): Coroutine function performing the upstream call and caching successful results.
+        fallback_keys (tuple): Further keys whose cached results also answer the request
+            (e.g. the pro tier's entry for a fast-tier request).
+
+    Returns:
+        dict: The result with a 'cached' flag telling whether it was served from the cache.
+    """
+    for key in (cache_key,) + tuple(fallback_keys):
+        cached = await result_cache.aget(key)
+        if cached is not None:
+            logger.info(f"Serving {label} from cache")
+            return {**cached, "cached": True}
+    return {**await single_flight.do(cache_key, generate), "cached": False}
+
+
+def select_model(code_snippet: str, latency_budget: float = None) -> str:
+  """
+  Picks the model tier for a request.
+
+  The fast tier is used when the client's latency budget is below
+  PRO_TIER_MIN_LATENCY_SECONDS, or when the code has at most FAST_TIER_MAX_LINES
+  lines and a total cyclomatic complexity of at most FAST_TIER_MAX_COMPLEXITY.
+  Everything else goes to the pro tier.
+
+  Args:
+    code_snippet (str): The code to be sent.
+    latency_budget (float, optional): Seconds the client is willing to wait.
+
+  Returns:
+    str: FAST_MODEL_NAME or MODEL_NAME.
+  """
+  if not MODEL_ROUTING:
+    return MODEL_NAME
+  if latency_budget is not None and latency_budget < PRO_TIER_MIN_LATENCY_SECONDS:
+    return FAST_MODEL_NAME
+  if code_snippet.count("\n") + 1 > FAST_TIER_MAX_LINES:
+    return MODEL_NAME
+  try:
+    complexity = compute_static_metrics(code_snippet)["cyclomatic_complexity"]
+  except RecursionError:
+    # Expressions nested too deeply to measure are not simple
+    return MODEL_NAME
+  if complexity is not None and complexity["total"] > FAST_TIER_MAX_COMPLEXITY:
+    return MODEL_NAME
+  return FAST_MODEL_NAME
+
+
+def _fallback_keys(endpoint: str, code_snippet: str, params: dict, model: str) -> tuple:
+  """Cache keys of higher tiers whose results also answer a request routed to `model`."""
+  if model == MODEL_NAME:
+    return ()
+  return (make_cache_key(endpoint, code_snippet, params, MODEL_NAME, PROMPT_VERSION),)
+
+
+def _check_budget(prompt, inputs: dict) -> int:
+  """Estimates the formatted prompt's tokens and raises TokenBudgetError above MAX_INPUT_TOKENS."""
+  estimated_tokens = estimate_prompt_tokens(prompt, inputs)
+  if estimated_tokens > MAX_INPUT_TOKENS:
+    logger.warning(f"Prompt of about {estimated_tokens} tokens exceeds MAX_INPUT_TOKENS={MAX_INPUT_TOKENS}")
+    raise TokenBudgetError(estimated_tokens, MAX_INPUT_TOKENS)
+  return estimated_tokens
+
+
+def _validated(parsed, schema):
+  """`parsed` normalized by a schema from app.schemas, or None if it does not conform."""
+  if not isinstance(parsed, dict):
+    return None
+  try:
+    return {**parsed, **schema.model_validate(parsed).model_dump()}
+  except ValidationError as e:
+    logger.error(f"Reply does not match {schema.__name__}: {e.error_count()} errors")
+    return None
+
+
+def _parse_reply(response: str):
+  """
+  Recovers the JSON object of a model reply with app.json_repair.
+
+  Returns:
+    dict: The object, marked with 'truncated_output' when it was salvaged from a
+          cut-off reply and is therefore incomplete; None if nothing was recovered.
+  """
+  parsed = parse_model_json(response)
+  if parsed.value is None:
+    logger.error(f"Error: No JSON object in model response ({parsed.describe()})")
+    logger.error(f"Raw response: {response[:500]}...")
+    return None
+  if parsed.repaired:
+    logger.warning(f"Repaired model response: {parsed.describe()}")
+  if parsed.truncated:
+    return {**parsed.value, "truncated_output": True}
+  return parsed.value
+
+
+async def _invoke_json(key: str, model: str, prompt, inputs: dict, schema, label: str, endpoint: str):
+  """
+  Calls the model and parses its JSON reply.
+
+  The formatted prompt is checked against MAX_INPUT_TOKENS first and generation
+  is capped at the endpoint's MAX_OUTPUT_TOKENS. The prompt carries the JSON
+  schema of `schema` (a model from app.schemas) and the reply is validated
+  against it. A fast-tier reply that does not conform is retried once on the pro
+  tier (MODEL_NAME); with STRUCTURED_OUTPUT, so is a non-conforming pro reply.
+
+  Replies are parsed with _parse_reply, so JSON wrapped in prose, with trailing
+  commas or cut off mid-array is still used.
+
+  Returns:
+    tuple: (reply normalized by the schema; if it never conformed, the last
+            parsed JSON object or None; model that produced it; estimated input tokens)
+  """
+  estimated_tokens = _check_budget(prompt, inputs)
+  retried = False
+  while True:
+    chain = client_pool.get_chain(key, model, prompt, MAX_OUTPUT_TOKENS[endpoint], json_mode=STRUCTURED_OUTPUT)
+
+    logger.info(f"Calling Gemini API ({model}) for {label}, about {estimated_tokens} input tokens...")
+    async with upstream_limiter.slot(key):
+      response = await chain.ainvoke(inputs)
+    logger.info(f"Received response from Gemini API. Length: {len(response)} characters")
+
+    parsed_response = _parse_reply(response)
+    validated = _validated(parsed_response, schema)
+    if validated is not None:
+      return validated, model, estimated_tokens
+    if retried or (model == MODEL_NAME and not STRUCTURED_OUTPUT):
+      return parsed_response, model, estimated_tokens
+    logger.warning(f"{model} reply for {label} failed validation - retrying on {MODEL_NAME}")
+    model = MODEL_NAME
+    retried = True
+
+
+def _static_checks(code_snippet: str):
+  """Runs app.static_checks, treating stored snippets joined by SNIPPET_SEPARATOR as separate modules."""
+  return run_static_checks(code_snippet, separator=SNIPPET_SEPARATOR)
+
+
+def _prompt_code(code_snippet: str, compress: bool):
+  """
+  The code to put into a prompt, and the app.compression mapping used (None if uncompressed).
+  Compression only happens when requested and when it parses and actually shrinks the code.
+  """
+  compressed = compress_code(code_snippet) if compress else None
+  if compressed is None:
+    return code_snippet, None
+  logger.info(f"Compressed code for prompt: {len(code_snippet)} -> {len(compressed.code)} characters")
+  return compressed.code, compressed
+
+
+async def map_snippets(snippets: list, worker, max_parallel: int = None) -> list:
+    """
+    Run a service function on each snippet concurrently, with bounded parallelism.
+
+    Args:
+        snippets (list): Code snippets to process.
+        worker (callable): Coroutine function taking one snippet.
+        max_parallel (int, optional): Concurrency bound. Defaults to BATCH_MAX_PARALLEL.
+
+    Returns:
+        list: One entry per snippet, in order - the worker's result, or the exception it raised.
+    """
+    semaphore = asyncio.Semaphore(max_parallel or BATCH_MAX_PARALLEL)
+
+    async def _run(snippet):
+        async with semaphore:
+            return await worker(snippet)
+
+    return await asyncio.gather(*[_run(snippet) for snippet in snippets], return_exceptions=True)
+
+
+async def analyze_code(code_snippet: str, api_key: str = None, incremental: bool = False, compress: bool = None,
+                       latency_budget: float = None):
   """
   Analyzes a given code snippet using the Gemini API via LangChain and returns structured analysis results.
 
+  Large sources that parse as Python (more than CHUNK_THRESHOLD_LINES lines, or a
+  prompt estimated above MAX_INPUT_TOKENS) are split at top-level definitions and
+  the chunks are analyzed in parallel; issue line numbers refer to the original code.
+  Findings of the local static checks are included in the issues and passed to
+  the model so it does not repeat them; code that does not parse is reported
+  without calling the model.
+
   Args:
     code_snippet (str): The code to be analyzed.
     api_key (str, optional): Gemini API key. If not provided, uses API_KEY from environment.
+    incremental (bool): Reuse cached issues of unchanged top-level definitions and
+      only send changed ones upstream. Adds 'reused_definitions' and
+      'analyzed_definitions' counts to the result.
+    compress (bool, optional): Send the code without comments, docstrings and blank
+      lines; line numbers are mapped back to the original. Defaults to PROMPT_COMPRESSION.
+    latency_budget (float, optional): Seconds the client is willing to wait; see select_model.
 
   Returns:
-    dict: A dictionary containing the analysis results with 'issues' key.
+    dict: A dictionary containing the analysis results with 'issues' key, the
+          'model' that produced them (single-call analyses only), the
+          'estimated_input_tokens' of the prompts sent and a 'cached' flag telling
+          whether it was served from the result cache.
+
+  Raises:
+    TokenBudgetError: If a prompt that cannot be split exceeds MAX_INPUT_TOKENS.
   """
   try:
     logger.info(f"Starting code analysis. Code length: {len(code_snippet)} characters")
+    static_issues, parseable = _static_checks(code_snippet)
+    if not parseable:
+      logger.info("Code does not parse - reporting syntax errors without calling Gemini")
+      return {"issues": static_issues, "cached": False}
     key = get_api_key(api_key)
-    genai.configure(api_key=key)
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", google_api_key=key, convert_system_message_to_human=True)
-
-    prompt_template = ChatPromptTemplate.from_messages([
-        ("system", "You are a helpful assistant that analyzes code for potential issues and returns the analysis in a structured JSON format."),
-        ("human", "Analyze the following code snippet for potential issues. \nProvide the analysis in a structured JSON format, including 'title', 'type', 'severity' (e.g., 'Low', 'Medium', 'High', 'Critical'), 'lineNumber', 'description', and 'suggestedFix' for each issue found.\n\nCode:\n```python\n{code_snippet}\n```\n\nExample JSON format for issues:\n{{\"issues\": [{{\"title\": \"Issue Title\", \"type\": \"Bug\", \"severity\": \"High\", \"lineNumber\": 10, \"description\": \"Detailed description of the issue.\", \"suggestedFix\": \"Recommended fix for the issue.\"}}]}}")
-    ])
-
-    output_parser = StrOutputParser()
+    compress = PROMPT_COMPRESSION if compress is None else compress
+    model = select_model(code_snippet, latency_budget)
+    if incremental:
+      units = split_definitions(code_snippet)
+      if units:
+        return await _analyze_incremental(code_snippet, units, key, compress, model)
+    oversized = estimate_prompt_tokens(
+        ANALYZE_PROMPT, {"code_snippet": code_snippet, "known_issues": ""}
+    ) > MAX_INPUT_TOKENS
+    if oversized or code_snippet.count("\n") + 1 > CHUNK_THRESHOLD_LINES:
+      chunks = chunk_source(code_snippet, CHUNK_MAX_LINES)
+      if chunks:
+        return await _analyze_chunks(code_snippet, chunks, key, compress, model)
+    return await _analyze_whole(code_snippet, key, compress, model)
+  except Exception as e:
+    logger.error(f"Error in analyze_code: {str(e)}", exc_info=True)
+    raise
 
-    chain = prompt_template | llm | output_parser
 
-    logger.info("Calling Gemini API for code analysis...")
-    response = chain.invoke({"code_snippet": code_snippet})
-    logger.info(f"Received response from Gemini API. Length: {len(response)} characters")
+async def _analyze_whole(code_snippet: str, key: str, compress: bool = False, model: str = MODEL_NAME) -> dict:
+  """
+  Analyzes code in a single upstream call, through the result cache.
 
-    # Remove markdown code block if present in the response
-    if response.startswith('```json') and response.endswith('```'):
-      response = response.replace('```json\n', '', 1)
-      response = response.replace('\n```', '', 1)
+  Compressed and uncompressed prompts share the cache entry: cached issues
+  always carry original line numbers.
+  """
+  cache_key = make_cache_key("analyze_code", code_snippet, None, model, PROMPT_VERSION)
 
-    try:
-      parsed_response = json.loads(response)
-      logger.info(f"Successfully parsed response. Found {len(parsed_response.get('issues', []))} issues")
-      return parsed_response
-    except json.JSONDecodeError as e:
-      logger.error(f"Error: Invalid JSON string received from model. Error: {str(e)}")
-      logger.error(f"Raw response: {response[:500]}...")
+  async def _generate():
+    static_issues, _ = _static_checks(code_snippet)
+    prompt_code, compressed = _prompt_code(code_snippet, compress)
+    known_issues = static_issues
+    if compressed:
+      known_issues = [{**issue, "lineNumber": compressed.to_compressed_line(issue["lineNumber"])} for issue in static_issues]
+    logger.info(f"{len(static_issues)} issues found locally")
+    parsed_response, used_model, estimated_tokens = await _invoke_json(key, model, ANALYZE_PROMPT, {
+        "code_snippet": prompt_code,
+        "known_issues": format_known_issues(known_issues)
+    }, AnalysisOutput, "code analysis", "analyze_code")
+    if parsed_response is None:
       return {
-          "issues": []
+          "issues": static_issues,
+          "estimated_input_tokens": estimated_tokens,
+          "invalid_response": True
       }
+
+    logger.info(f"Successfully parsed response. Found {len(parsed_response.get('issues', []))} issues")
+    if compressed:
+      for issue in parsed_response.get("issues", []):
+        if isinstance(issue, dict) and isinstance(issue.get("lineNumber"), int):
+          issue["lineNumber"] = compressed.to_original_line(issue["lineNumber"])
+    parsed_response["issues"] = merge_issues(static_issues, parsed_response.get("issues", []))
+    parsed_response["model"] = used_model
+    parsed_response["estimated_input_tokens"] = estimated_tokens
+    if _complete(parsed_response):
+      await result_cache.aset(make_cache_key("analyze_code", code_snippet, None, used_model, PROMPT_VERSION), parsed_response)
+    return parsed_response
+
+  return await _serve_cached(
+      cache_key, "code analysis", _generate, _fallback_keys("analyze_code", code_snippet, None, model)
+  )
+
+
+async def _remember_analysis(code_snippet: str, issues: list, model: str) -> None:
+  """
+  Caches issues merged from several upstream calls under the whole code's analysis key,
+  so analyze_code, stream_analyze_code and get_code_metrics find them directly.
+  """
+  cache_key = make_cache_key("analyze_code", code_snippet, None, model, PROMPT_VERSION)
+  await result_cache.aset(cache_key, {"issues": issues})
+
+
+async def _analyze_chunks(code_snippet: str, chunks: list, key: str, compress: bool = False,
+                          model: str = MODEL_NAME) -> dict:
+  """
+  Analyzes chunks from app.chunking in parallel and merges their issues.
+
+  Issues are remapped to original line numbers; issues reported on a chunk's
+  prepended context are dropped because that code is owned by another chunk.
+  Chunks whose call failed are counted in 'failed_chunks' (of 'total_chunks');
+  their issues are missing from the result.
+  """
+  logger.info(f"Analyzing code in {len(chunks)} chunks")
+  results = await map_snippets(chunks, lambda chunk: _analyze_whole(chunk.code, key, compress, model))
+  if all(isinstance(result, Exception) for result in results):
+    raise results[0]
+
+  issues = []
+  failed = 0
+  for chunk, result in zip(chunks, results):
+    if not isinstance(result, dict):
+      logger.error(f"Chunk starting at line {chunk.start_line} failed: {result}")
+      failed += 1
+      continue
+    for issue in result.get("issues", []):
+      if not isinstance(issue, dict):
+        continue
+      line_number = issue.get("lineNumber")
+      if isinstance(line_number, int):
+        issue["lineNumber"] = chunk.to_original_line(line_number)
+        if issue["lineNumber"] is None:
+          continue
+      issues.append(issue)
+  issues.sort(key=lambda issue: issue.get("lineNumber") or 0)
+  if all(_complete(result) for result in results):
+    await _remember_analysis(code_snippet, issues, model)
+  return {
+      "issues": issues,
+      "estimated_input_tokens": _total_estimate(results),
+      "truncated_output": any(isinstance(result, dict) and result.get("truncated_output") for result in results),
+      "cached": all(isinstance(result, dict) and result.get("cached") for result in results),
+      "failed_chunks": failed,
+      "total_chunks": len(chunks)
+  }
+
+
+def _complete(result) -> bool:
+  """Whether an analysis result is a full, valid model answer and may be cached."""
+  return isinstance(result, dict) and not result.get("invalid_response") and not result.get("truncated_output")
+
+
+def _total_estimate(results: list) -> int:
+  """Sum of the input token estimates of several analysis results."""
+  return sum(result.get("estimated_input_tokens", 0) for result in results if isinstance(result, dict))
+
+
+def _body_anchor(unit) -> int:
+  """Original line of a unit's first non-blank body line; cached line numbers are relative to it."""
+  body_lines = unit.body.split("\n")
+  leading_blank = next((i for i, line in enumerate(body_lines) if line.strip()), 0)
+  return unit.start_line + leading_blank
+
+
+async def _analyze_incremental(code_snippet: str, units: list, key: str, compress: bool = False,
+                               model: str = MODEL_NAME) -> dict:
+  """
+  Analyzes only the top-level definitions whose issues are not cached yet.
+
+  Every unit from app.chunking.split_definitions is fingerprinted by its body
+  alone, and its issues are cached with line numbers relative to that body, so
+  they stay valid when the definition moves or other code changes. Consecutive
+  changed units are packed into chunks of about CHUNK_MAX_LINES lines for the
+  upstream calls; the results are split back per unit and cached. Chunks whose
+  call failed are counted in 'failed_chunks' as in _analyze_chunks.
+  """
+  fingerprints = [
+      make_cache_key("analyze_definition", unit.body, None, model, PROMPT_VERSION)
+      for unit in units
+  ]
+  unit_issues = [await result_cache.aget(fingerprint) for fingerprint in fingerprints]
+  missing = [index for index, entry in enumerate(unit_issues) if entry is None]
+  logger.info(f"Incremental analysis: {len(units) - len(missing)} of {len(units)} definitions unchanged")
+
+  # Pack runs of adjacent changed units into upstream requests
+  groups = []
+  for index in missing:
+    unit_lines = units[index].end_line - units[index].start_line + 1
+    if groups and groups[-1][-1] == index - 1 and \
+        units[index].end_line - units[groups[-1][0]].start_line + 1 <= max(CHUNK_MAX_LINES, unit_lines):
+      groups[-1].append(index)
+    else:
+      groups.append([index])
+  packs = chunks_for_ranges(
+      code_snippet, [(units[group[0]].start_line, units[group[-1]].end_line) for group in groups]
+  ) if groups else []
+
+  results = await map_snippets(packs, lambda pack: _analyze_whole(pack.code, key, compress, model))
+  if results and all(isinstance(result, Exception) for result in results):
+    raise results[0]
+
+  complete = True
+  failed = 0
+  for group, pack, result in zip(groups, packs, results):
+    if not _complete(result):
+      complete = False
+    if not isinstance(result, dict):
+      logger.error(f"Definitions starting at line {pack.start_line} failed: {result}")
+      failed += 1
+      continue
+    split = {index: [] for index in group}
+    for issue in result.get("issues", []):
+      if not isinstance(issue, dict):
+        continue
+      line_number = issue.get("lineNumber")
+      owner = group[0]
+      if isinstance(line_number, int):
+        original = pack.to_original_line(line_number)
+        if original is None:
+          continue
+        owner = next(index for index in group if units[index].start_line <= original <= units[index].end_line)
+        issue["lineNumber"] = original - _body_anchor(units[owner])
+      split[owner].append(issue)
+    for index, issues in split.items():
+      unit_issues[index] = {"issues": issues}
+      if _complete(result):
+        await result_cache.aset(fingerprints[index], unit_issues[index])
+
+  # Shift body-relative line numbers to where each definition is now
+  issues = []
+  for unit, entry in zip(units, unit_issues):
+    for issue in (entry or {}).get("issues", []):
+      if isinstance(issue.get("lineNumber"), int):
+        issue["lineNumber"] += _body_anchor(unit)
+      issues.append(issue)
+  issues.sort(key=lambda issue: issue.get("lineNumber") or 0)
+  if complete:
+    await _remember_analysis(code_snippet, issues, model)
+  return {
+      "issues": issues,
+      "cached": not groups,
+      "estimated_input_tokens": _total_estimate(results),
+      "truncated_output": any(isinstance(result, dict) and result.get("truncated_output") for result in results),
+      "reused_definitions": len(units) - len(missing),
+      "analyzed_definitions": len(missing),
+      "failed_chunks": failed,
+      "total_chunks": len(packs)
+  }
+
+
+async def stream_analyze_code(code_snippet: str, api_key: str = None):
+  """
+  Streams analysis issues as the model generates them.
+
+  Uses the same prompt and cache entry as analyze_code, so a streamed analysis
+  serves later non-streaming requests for the same code and vice versa.
+
+  Args:
+    code_snippet (str): The code to be analyzed.
+    api_key (str, optional): Gemini API key. If not provided, uses API_KEY from environment.
+
+  Yields:
+    tuple: ("issue", dict) for every issue as soon as it is complete, then
+           ("done", dict) with a 'cached' flag.
+  """
+  try:
+    logger.info(f"Starting streaming code analysis. Code length: {len(code_snippet)} characters")
+    static_issues, parseable = _static_checks(code_snippet)
+    if not parseable:
+      logger.info("Code does not parse - reporting syntax errors without calling Gemini")
+      for issue in static_issues:
+        yield "issue", issue
+      yield "done", {"cached": False}
+      return
+    key = get_api_key(api_key)
+    cache_key = make_cache_key("analyze_code", code_snippet, None, MODEL_NAME, PROMPT_VERSION)
+
+    cached = await result_cache.aget(cache_key)
+    if cached is not None:
+      logger.info("Serving code analysis stream from cache")
+      for issue in cached.get("issues", []):
+        yield "issue", issue
+      yield "done", {"cached": True}
+      return
+
+    # Local findings go out before the model has produced anything
+    for issue in static_issues:
+      yield "issue", issue
+
+    inputs = {
+        "code_snippet": code_snippet,
+        "known_issues": format_known_issues(static_issues)
+    }
+    _check_budget(ANALYZE_PROMPT, inputs)
+    chain = client_pool.get_chain(key, MODEL_NAME, ANALYZE_PROMPT, MAX_OUTPUT_TOKENS["analyze_code"])
+    parser = ArrayItemStreamParser("issues")
+    seen = {(issue["lineNumber"], issue["title"].lower()) for issue in static_issues}
+
+    logger.info("Streaming Gemini API response for code analysis...")
+    async with upstream_limiter.slot(key):
+      async for chunk in chain.astream(inputs):
+        for issue in parser.feed(chunk):
+          if (issue.get("lineNumber"), str(issue.get("title", "")).lower()) not in seen:
+            yield "issue", issue
+    response = parser.text
+    logger.info(f"Stream finished. Length: {len(response)} characters, {parser.items_emitted} issues")
+
+    # Only a reply that passes the schema may serve later non-streaming requests
+    parsed_response = _validated(_parse_reply(response), AnalysisOutput)
+    if _complete(parsed_response):
+      parsed_response["issues"] = merge_issues(static_issues, parsed_response.get("issues", []))
+      parsed_response["model"] = MODEL_NAME
+      await result_cache.aset(cache_key, parsed_response)
+    yield "done", {"cached": False}
   except Exception as e:
-    logger.error(f"Error in analyze_code: {str(e)}", exc_info=True)
+    logger.error(f"Error in stream_analyze_code: {str(e)}", exc_info=True)
     raise
 
 
-def get_code_metrics(code_snippet: str, api_key: str = None) -> dict:
+async def _derived_metrics(code_snippet: str):
+  """Summary metrics aggregated from a cached analysis of the code (pro tier preferred), or None if there is none."""
+  analysis = None
+  for model in (MODEL_NAME, FAST_MODEL_NAME):
+    analysis = await result_cache.aget(make_cache_key("analyze_code", code_snippet, None, model, PROMPT_VERSION))
+    if analysis is not None:
+      break
+  if analysis is None:
+    return None
+  logger.info("Deriving code metrics from cached analysis")
+  return {**metrics_from_issues(analysis.get("issues", [])), "derived_from_analysis": True}
+
+
+async def get_code_metrics(code_snippet: str, api_key: str = None, mode: str = "llm", compress: bool = None,
+                           latency_budget: float = None) -> dict:
   """
   Calculates summary metrics and issue distribution by directly querying the Gemini API.
 
   Args:
     code_snippet (str): The code to be analyzed for metrics.
     api_key (str, optional): Gemini API key. If not provided, uses API_KEY from environment.
+    mode (str): "llm" asks Gemini only; "local" computes static metrics from app.metrics
+      without any model call; "hybrid" does both.
+    compress (bool, optional): Send the code without comments, docstrings and blank
+      lines. Defaults to PROMPT_COMPRESSION.
+    latency_budget (float, optional): Seconds the client is willing to wait; see select_model.
+
+  When an analysis of the same code is cached, summary metrics and issue
+  distribution are aggregated from its issues instead (see METRICS_FROM_ANALYSIS).
 
   Returns:
-    dict: A dictionary containing 'summary_metrics' and 'issue_distribution' from Gemini.
+    dict: A dictionary containing 'summary_metrics' and 'issue_distribution' from Gemini
+          (absent in local mode), 'static_metrics' (local and hybrid modes), a
+          'derived_from_analysis' flag, and a 'cached' flag telling whether it was
+          served from the result cache.
   """
   try:
-    logger.info(f"Starting code metrics calculation. Code length: {len(code_snippet)} characters")
+    logger.info(f"Starting code metrics calculation ({mode}). Code length: {len(code_snippet)} characters")
+    if mode == "local":
+      return {"static_metrics": compute_static_metrics(code_snippet), "cached": False}
+    if mode == "hybrid":
+      static_metrics = compute_static_metrics(code_snippet)
+      return {
+          **await get_code_metrics(code_snippet, api_key=api_key, compress=compress, latency_budget=latency_budget),
+          "static_metrics": static_metrics
+      }
+    model = select_model(code_snippet, latency_budget)
+    cache_key = make_cache_key("get_code_metrics", code_snippet, None, model, PROMPT_VERSION)
+    fallback_keys = _fallback_keys("get_code_metrics", code_snippet, None, model)
+    # Metrics the model produced for this code (e.g. seeded by generate_report) take precedence
+    model_metrics_cached = False
+    for candidate in (cache_key,) + fallback_keys:
+      model_metrics_cached = model_metrics_cached or await result_cache.aget(candidate) is not None
+    if METRICS_FROM_ANALYSIS and not model_metrics_cached:
+      derived = await _derived_metrics(code_snippet)
+      if derived is not None:
+        return {**derived, "cached": True}
     key = get_api_key(api_key)
-    genai.configure(api_key=key)
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", google_api_key=key, convert_system_message_to_human=True)
-
-    prompt_template = ChatPromptTemplate.from_messages([
-        ("system", "You are a helpful assistant that analyzes code and provides summary metrics and issue distribution in a structured JSON format."),
-        ("human", """Analyze the following code snippet and provide the analysis in a structured JSON format. I need two main sections: 'summary_metrics' and 'issue_distribution'.\n\nFor 'summary_metrics', include:\n- 'code_quality_score' (an integer from 0-100 where higher is better)\n- 'security_rating' (an integer from 0-100 where higher is better)\n- 'bug_density' (count of bugs/runtime errors)\n- 'critical_issue_count' (count of critical severity issues)\n\nFor 'issue_distribution', include:\n- 'security_vulnerabilities' (count of security/vulnerability issues)\n- 'code_smells' (count of code smell issues)\n- 'best_practices' (count of best practice violations, if any)\n- 'performance_issues' (count of performance-related issues, if any)\n
-Ensure the output is a single JSON object. Here's an example of the desired JSON format:\n```json\n{{\n  \"summary_metrics\": {{\n    \"code_quality_score\": 85,\n    \"security_rating\": 90,\n    \"bug_density\": 1,\n    \"critical_issue_count\": 0\n  }},\n  \"issue_distribution\": {{\n    \"security_vulnerabilities\": 0,\n    \"code_smells\": 2,\n    \"best_practices\": 1,\n    \"performance_issues\": 0\n  }}\n}}\n```\n
-Code:\n```python\n{code_snippet}\n```""")
-    ])
-
-    output_parser = StrOutputParser()
-
-    chain = prompt_template | llm | output_parser
-
-    logger.info("Calling Gemini API for code metrics...")
-    response = chain.invoke({"code_snippet": code_snippet})
-    logger.info(f"Received response from Gemini API. Length: {len(response)} characters")
 
-    # Remove markdown code block if present in the response
-    if response.startswith('```json') and response.endswith('```'):
-      response = response.replace('```json\n', '', 1)
-      response = response.replace('\n```', '', 1)
+    async def _generate():
+      parsed_response, used_model, estimated_tokens = await _invoke_json(key, model, METRICS_PROMPT, {
+          "code_snippet": _prompt_code(code_snippet, PROMPT_COMPRESSION if compress is None else compress)[0]
+      }, MetricsOutput, "code metrics", "get_code_metrics")
+      if parsed_response is None:
+        return {
+            "summary_metrics": {},
+            "issue_distribution": {},
+            "estimated_input_tokens": estimated_tokens
+        }
 
-    try:
-      parsed_response = json.loads(response)
       logger.info(f"Successfully parsed metrics response")
+      parsed_response["model"] = used_model
+      parsed_response["estimated_input_tokens"] = estimated_tokens
+      if _complete(parsed_response):
+        await result_cache.aset(make_cache_key("get_code_metrics", code_snippet, None, used_model, PROMPT_VERSION), parsed_response)
       return parsed_response
-    except json.JSONDecodeError as e:
-      logger.error(f"Error: Invalid JSON string received from model. Error: {str(e)}")
-      logger.error(f"Raw response: {response[:500]}...")
-      return {
-          "summary_metrics": {},
-          "issue_distribution": {}
-      }
+
+    return await _serve_cached(cache_key, "code metrics", _generate, fallback_keys)
   except Exception as e:
     logger.error(f"Error in get_code_metrics: {str(e)}", exc_info=True)
     raise
 
 
-def inject_bugs(code_snippet: str, bug_type: str, severity_level: int, num_bugs: int, api_key: str = None) -> dict:
+def _applied_edits(code_snippet: str, reply: dict):
+  """
+  Builds an injection result from an INJECT_BUGS_EDITS_PROMPT reply by applying its edits locally.
+
+  Returns:
+    dict: 'buggy_code', 'bugs_injected' and 'skipped_edits', or None if no edit could be applied.
+  """
+  edits = [
+      edit for edit in reply.get("edits", [])
+      if isinstance(edit, dict) and isinstance(edit.get("line_start"), int) and isinstance(edit.get("line_end"), int)
+  ]
+  buggy_code, bugs, skipped = apply_edits(code_snippet, edits)
+  if skipped:
+    logger.warning(f"Skipped {skipped} of {len(reply.get('edits', []))} edits that did not match the code")
+  if not bugs:
+    logger.error("Error: No edit from the model could be applied")
+    return None
+  result = {"buggy_code": buggy_code, "bugs_injected": bugs, "skipped_edits": skipped}
+  if reply.get("truncated_output"):
+    result["truncated_output"] = True
+  return result
+
+
+def _local_variants(code_snippet: str, bug_type: str, severity_level: int, num_bugs: int, variants: int) -> list:
+  """
+  Up to `variants` distinct local injections (app.mutations), found by varying
+  the seed that picks the mutated places. The first one is the single-variant result.
+  """
+  found = []
+  seen = set()
+  # A few extra seeds per variant, as small code has few distinct combinations of places
+  for attempt in range(variants * 4):
+    result = inject_local_bugs(code_snippet, bug_type, severity_level, num_bugs, seed=str(attempt) if attempt else "")
+    if result is None:
+      break
+    normalized = normalize_code(result["buggy_code"])
+    if normalized not in seen:
+      seen.add(normalized)
+      found.append(result)
+      if len(found) == variants:
+        break
+  return found
+
+
+def _usable_variants(code_snippet: str, reply: dict, output_mode: str) -> list:
+  """
+  The variants of a multi-variant reply that are usable on their own.
+
+  Each variant is validated against the single-injection schema (InjectionOutput,
+  or InjectionEditsOutput with its edits applied in "edits" mode); variants that
+  leave the code unchanged or repeat an earlier variant are dropped.
+  """
+  found = []
+  seen = {normalize_code(code_snippet)}
+  for variant in reply.get("variants") or []:
+    if output_mode == "edits":
+      variant = _validated(variant, InjectionEditsOutput)
+      variant = _applied_edits(code_snippet, variant) if variant is not None else None
+    else:
+      variant = _validated(variant, InjectionOutput)
+    if variant is None:
+      continue
+    normalized = normalize_code(variant["buggy_code"])
+    if normalized in seen:
+      logger.warning("Dropped a variant that repeats the original code or an earlier variant")
+      continue
+    seen.add(normalized)
+    found.append({key: variant[key] for key in ("buggy_code", "bugs_injected", "skipped_edits") if key in variant})
+  return found
+
+
+async def _inject_variants(key: str, model: str, code_snippet: str, params: dict, output_mode: str):
+  """
+  Asks for params['variants'] independent injections in a single call, so the
+  code is sent once for all of them.
+
+  Returns:
+    tuple: (result with the first usable variant as 'buggy_code' and 'bugs_injected',
+            all of them in 'variants' and how many of the requested ones were unusable
+            in 'rejected_variants', or None if none was usable; model used; estimated input tokens)
+  """
+  inputs = {
+      "num_variants": params["variants"],
+      "num_bugs": params["num_bugs"],
+      "bug_type": params["bug_type"],
+      "severity_level": params["severity_level"]
+  }
+  if output_mode == "edits":
+    prompt = INJECT_BUGS_EDITS_VARIANTS_PROMPT
+    inputs["numbered_code"] = number_lines(code_snippet)
+  else:
+    prompt = INJECT_BUGS_VARIANTS_PROMPT
+    inputs["code_snippet"] = code_snippet
+  reply, used_model, estimated_tokens = await _invoke_json(
+      key, model, prompt, inputs, VariantsEnvelope, f"bug injection ({params['variants']} variants)", "inject_bugs"
+  )
+  if reply is None:
+    return None, used_model, estimated_tokens
+  variants = _usable_variants(code_snippet, reply, output_mode)
+  if not variants:
+    logger.error("Error: No usable variant in model response")
+    return None, used_model, estimated_tokens
+
+  rejected = params["variants"] - len(variants)
+  if rejected > 0:
+    logger.warning(f"{rejected} of {params['variants']} requested variants were missing or unusable")
+  result = {**variants[0], "variants": variants, "rejected_variants": max(rejected, 0)}
+  if output_mode == "edits":
+    result["skipped_edits"] = sum(variant.get("skipped_edits", 0) for variant in variants)
+  if reply.get("truncated_output"):
+    result["truncated_output"] = True
+  return result, used_model, estimated_tokens
+
+
+async def inject_bugs(code_snippet: str, bug_type: str, severity_level: int, num_bugs: int, api_key: str = None,
+                      latency_budget: float = None, output_mode: str = "full", engine: str = "auto",
+                      variants: int = 1) -> dict:
   """
   Injects specified types and number of bugs into a given code snippet using the Gemini API.
 
+  Bug types known to app.mutations (division by zero, off-by-one, inverted
+  condition, SQL injection, swallowed exception, None dereference, resource
+  leak) are injected locally with AST mutations when the code has enough
+  places for them; the model is only called otherwise.
+
+  In "edits" output mode the model returns only line-anchored edits, which are
+  applied locally to build 'buggy_code'; 'line_number's then come from the
+  applied edits. Both modes produce the same result and share the cache entry.
+
+  With `variants` > 1, that many independent injections are requested in one
+  call (one prompt, one copy of the code) and validated one by one; the first
+  usable one is also returned as 'buggy_code' and 'bugs_injected'.
+
   Args:
     code_snippet (str): The original code snippet where bugs will be injected.
     bug_type (str): The type of bug to inject (e.g., 'SQL Injection', 'Division by Zero').
     severity_level (int): The severity level of the bugs (e.g., 1 for low, 5 for critical).
     num_bugs (int): The number of bugs to inject.
     api_key (str, optional): Gemini API key. If not provided, uses API_KEY from environment.
+    latency_budget (float, optional): Seconds the client is willing to wait; see select_model.
+    output_mode (str): "full" to have the model write the whole modified code,
+      "edits" to have it return only the changed lines.
+    engine (str): "auto" to mutate locally when possible (if LOCAL_MUTATIONS is
+      enabled), "local" to require local mutation, "model" to always use Gemini.
+    variants (int): Number of different buggy versions to generate.
 
   Returns:
     dict: A dictionary containing the modified code with injected bugs and details
-          about the injected bugs (e.g., their locations, types, and severities).
+          about the injected bugs (e.g., their locations, types, and severities),
+          the 'model' used, the 'engine' ("local" or "model"), plus a 'cached' flag
+          telling whether it was served from the result cache. With variants > 1
+          also 'variants' (each with 'buggy_code' and 'bugs_injected') and
+          'rejected_variants', the number of requested variants not returned.
+
+  Raises:
+    ValueError: If engine is "local" and the bug type or code cannot be mutated locally.
   """
   try:
-    logger.info(f"Starting bug injection. Code length: {len(code_snippet)} chars, type: {bug_type}, severity: {severity_level}, num: {num_bugs}")
+    logger.info(f"Starting bug injection. Code length: {len(code_snippet)} chars, type: {bug_type}, severity: {severity_level}, num: {num_bugs}, output: {output_mode}, engine: {engine}, variants: {variants}")
+    if engine == "local" or (engine == "auto" and LOCAL_MUTATIONS):
+      local_results = _local_variants(code_snippet, bug_type, severity_level, num_bugs, variants)
+      # "auto" only settles for local results if they cover every requested variant
+      if len(local_results) == variants or (engine == "local" and local_results):
+        logger.info(f"Injected {num_bugs} bugs locally with AST mutations, {len(local_results)} variant(s)")
+        result = {**local_results[0], "model": None, "engine": "local", "estimated_input_tokens": 0, "cached": False}
+        if variants > 1:
+          result["variants"] = local_results
+          result["rejected_variants"] = variants - len(local_results)
+        return result
+      if engine == "local":
+        raise ValueError(
+            f"Cannot inject {num_bugs} '{bug_type}' bug(s) locally: the bug type is not supported "
+            "or the code is not valid Python with enough places to inject it"
+        )
     key = get_api_key(api_key)
-    genai.configure(api_key=key)
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", google_api_key=key, convert_system_message_to_human=True)
+    params = {"bug_type": bug_type, "severity_level": severity_level, "num_bugs": num_bugs}
+    if variants > 1:
+      params["variants"] = variants
+    model = select_model(code_snippet, latency_budget)
+    cache_key = make_cache_key("inject_bugs", code_snippet, params, model, PROMPT_VERSION)
 
-    prompt_template = ChatPromptTemplate.from_messages([
-        ("system", "You are a helpful assistant that injects bugs into code based on given parameters and returns the modified code and bug details in JSON format."),
-        ("human", """Inject {num_bugs} bugs of type '{bug_type}' with severity level {severity_level} into the following Python code snippet.\nProvide the output in a structured JSON format with two keys: 'buggy_code' (containing the full modified code) and 'bugs_injected' (an array of objects, where each object describes an injected bug with 'type', 'line_number', and 'description').\n\nCode:\n```python\n{code_snippet}\n```\n\nExample JSON format:\n{{\n  "buggy_code": "def example_function():\n    # Some example code without further template variables\n    return 0",\n  "bugs_injected": [\n    {{\n      "type": "{bug_type}", "line_number": 2, "description": "Description of the injected bug."\n    }}\n  ]\n}}\n""")
-    ])
+    async def _generate():
+      if variants > 1:
+        parsed_response, used_model, estimated_tokens = await _inject_variants(
+            key, model, code_snippet, params, output_mode
+        )
+      elif output_mode == "edits":
+        parsed_response, used_model, estimated_tokens = await _invoke_json(key, model, INJECT_BUGS_EDITS_PROMPT, {
+            "numbered_code": number_lines(code_snippet),
+            "num_bugs": num_bugs,
+            "bug_type": bug_type,
+            "severity_level": severity_level
+        }, InjectionEditsOutput, "bug injection (edits)", "inject_bugs")
+        if parsed_response is not None:
+          parsed_response = _applied_edits(code_snippet, parsed_response)
+      else:
+        parsed_response, used_model, estimated_tokens = await _invoke_json(key, model, INJECT_BUGS_PROMPT, {
+            "code_snippet": code_snippet,
+            "num_bugs": num_bugs,
+            "bug_type": bug_type,
+            "severity_level": severity_level
+        }, InjectionOutput, "bug injection", "inject_bugs")
+      if parsed_response is None:
+        return {
+            "buggy_code": code_snippet, # Return original code on error
+            "bugs_injected": [],
+            "estimated_input_tokens": estimated_tokens
+        }
 
-    output_parser = StrOutputParser()
+      logger.info(f"Successfully parsed bug injection response. Injected {len(parsed_response.get('bugs_injected', []))} bugs")
+      parsed_response["model"] = used_model
+      parsed_response["engine"] = "model"
+      parsed_response["estimated_input_tokens"] = estimated_tokens
+      # Partial variant sets are not cached, so a retry can get all of them
+      if _complete(parsed_response) and not parsed_response.get("rejected_variants"):
+        await result_cache.aset(make_cache_key("inject_bugs", code_snippet, params, used_model, PROMPT_VERSION), parsed_response)
+      return parsed_response
 
-    chain = prompt_template | llm | output_parser
+    return await _serve_cached(
+        cache_key, "bug injection", _generate, _fallback_keys("inject_bugs", code_snippet, params, model)
+    )
+  except Exception as e:
+    logger.error(f"Error in inject_bugs: {str(e)}", exc_info=True)
+    raise
 
-    logger.info("Calling Gemini API for bug injection...")
-    response = chain.invoke({
-        "code_snippet": code_snippet,
-        "num_bugs": num_bugs,
-        "bug_type": bug_type,
-        "severity_level": severity_level
-    })
-    logger.info(f"Received response from Gemini API. Length: {len(response)} characters")
 
-    # Remove markdown code block if present in the response
-    if response.startswith('```json') and response.endswith('```'):
-      response = response.replace('```json\n', '', 1)
-      response = response.replace('\n```', '', 1)
+async def generate_report(code_snippet: str, api_key: str = None, injection: dict = None) -> dict:
+  """
+  Produces issues, summary metrics, issue distribution and optionally a bug injection
+  from a single Gemini call with a merged prompt.
+
+  Each part is also stored under the cache key of its own endpoint, so later
+  analyze_code, get_code_metrics and inject_bugs calls for the same code are served
+  from the cache. Conversely, if every part is already cached, no call is made.
+  As in analyze_code, findings of the local static checks are passed to the model
+  and included in the issues; code that does not parse is reported without
+  calling the model.
 
-    try:
-      parsed_response = json.loads(response)
-      logger.info(f"Successfully parsed bug injection response. Injected {len(parsed_response.get('bugs_injected', []))} bugs")
-      return parsed_response
-    except json.JSONDecodeError as e:
-      logger.error(f"Error: Invalid JSON string received from model. Error: {str(e)}")
-      logger.error(f"Raw response: {response[:500]}...")
+  Args:
+    code_snippet (str): The code to be reviewed.
+    api_key (str, optional): Gemini API key. If not provided, uses API_KEY from environment.
+    injection (dict, optional): 'bug_type', 'severity_level' and 'num_bugs' to also inject bugs.
+
+  Returns:
+    dict: 'issues', 'summary_metrics', 'issue_distribution', 'injection' (None unless
+          requested) and a 'cached' flag.
+  """
+  try:
+    logger.info(f"Starting report generation. Code length: {len(code_snippet)} characters, injection: {bool(injection)}")
+    static_issues, parseable = _static_checks(code_snippet)
+    if not parseable:
+      logger.info("Code does not parse - reporting syntax errors without calling Gemini")
+      return {"issues": static_issues, "summary_metrics": {}, "issue_distribution": {}, "injection": None, "cached": False}
+    analysis_key = make_cache_key("analyze_code", code_snippet, None, MODEL_NAME, PROMPT_VERSION)
+    metrics_key = make_cache_key("get_code_metrics", code_snippet, None, MODEL_NAME, PROMPT_VERSION)
+    inject_key = make_cache_key("inject_bugs", code_snippet, injection, MODEL_NAME, PROMPT_VERSION) if injection else None
+
+    # Assemble from the per-endpoint caches when everything is there
+    analysis = await result_cache.aget(analysis_key)
+    metrics = await result_cache.aget(metrics_key)
+    if metrics is None and METRICS_FROM_ANALYSIS and analysis is not None:
+      metrics = metrics_from_issues(analysis.get("issues", []))
+    injected = await result_cache.aget(inject_key) if injection else None
+    if analysis is not None and metrics is not None and (not injection or injected is not None):
+      logger.info("Serving report from cache")
       return {
-          "buggy_code": code_snippet, # Return original code on error
-          "bugs_injected": []
+          "issues": analysis.get("issues", []),
+          "summary_metrics": metrics.get("summary_metrics", {}),
+          "issue_distribution": metrics.get("issue_distribution", {}),
+          "injection": injected,
+          "cached": True
+      }
+
+    key = get_api_key(api_key)
+    cache_key = make_cache_key("report", code_snippet, injection, MODEL_NAME, PROMPT_VERSION)
+
+    async def _generate():
+      prompt, schema = (REPORT_WITH_INJECTION_PROMPT, ReportWithInjectionOutput) if injection else (REPORT_PROMPT, ReportOutput)
+      parsed_response, used_model, estimated_tokens = await _invoke_json(key, MODEL_NAME, prompt, {
+          "code_snippet": code_snippet,
+          "known_issues": format_known_issues(static_issues),
+          **(injection or {})
+      }, schema, "combined report", "report")
+      if parsed_response is None:
+        return {
+            "issues": static_issues,
+            "summary_metrics": {},
+            "issue_distribution": {},
+            "injection": {"buggy_code": code_snippet, "bugs_injected": []} if injection else None,
+            "estimated_input_tokens": estimated_tokens
+        }
+
+      report = {
+          "issues": merge_issues(static_issues, parsed_response.get("issues", [])),
+          "summary_metrics": parsed_response.get("summary_metrics", {}),
+          "issue_distribution": parsed_response.get("issue_distribution", {}),
+          "injection": parsed_response.get("injection") if injection else None,
+          "estimated_input_tokens": estimated_tokens
       }
+      logger.info(f"Successfully parsed report. Found {len(report['issues'])} issues")
+      if parsed_response.get("truncated_output"):
+        # Incomplete reply - return what was salvaged without caching any part of it
+        return {**report, "truncated_output": True}
+
+      # A part may only serve its own endpoint if it passes that endpoint's schema,
+      # stored with the same fields the endpoint itself stores
+      analysis = _validated({"issues": parsed_response.get("issues")}, AnalysisOutput)
+      metrics = _validated({
+          "summary_metrics": parsed_response.get("summary_metrics"),
+          "issue_distribution": parsed_response.get("issue_distribution")
+      }, MetricsOutput)
+      injected = _validated(parsed_response.get("injection"), InjectionOutput) if injection else None
+      stored = {"model": used_model, "estimated_input_tokens": estimated_tokens}
+      if analysis is not None:
+        await result_cache.aset(analysis_key, {"issues": merge_issues(static_issues, analysis["issues"]), **stored})
+      if metrics is not None:
+        await result_cache.aset(metrics_key, {**metrics, **stored})
+      if injected is not None:
+        await result_cache.aset(inject_key, {**injected, **stored, "engine": "model"})
+      if analysis is not None and metrics is not None and (not injection or injected is not None):
+        await result_cache.aset(cache_key, report)
+      return report
+
+    return await _serve_cached(cache_key, "report", _generate)
   except Exception as e:
-    logger.error(f"Error in inject_bugs: {str(e)}", exc_info=True)
+    logger.error(f"Error in generate_report: {str(e)}", exc_info=True)
     raise
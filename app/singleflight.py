@@ -0,0 +1,53 @@
+"""
+Single-flight coalescing of identical concurrent upstream calls.
+The first caller for a key starts the call; concurrent callers with the same
+key await it and receive its result or its error.
+"""
+
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Deduplicates concurrent coroutine calls that share a key."""
+
+    def __init__(self):
+        self._calls: Dict[str, "asyncio.Task"] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `fn` unless a call for `key` is already in flight, in which case
+        await that call instead.
+
+        The call runs as its own task, so a caller that is cancelled (e.g. the
+        client disconnected) does not cancel the call for everyone else.
+
+        Args:
+            key (str): Identity of the call (typically the result cache key).
+            fn (callable): Zero-argument coroutine function performing the upstream call.
+
+        Returns:
+            A deep copy of the result of `fn`, so each caller can mutate it freely.
+
+        Raises:
+            Whatever `fn` raised, for every caller awaiting it.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+    def _finish(self, key: str, task: "asyncio.Task") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            task.exception()
+
+    def in_flight(self) -> int:
+        """Number of distinct keys currently being computed."""
+        return len(self._calls)
@@ -0,0 +1,144 @@
+"""
+Fast local checks run before code is sent to the model.
+Reports syntax errors and a few patterns that need no model to spot, in the
+same format as the issues returned by analyze_code.
+"""
+
+import ast
+import re
+from typing import Dict, List, Optional, Tuple
+
+SYNTAX_ERROR_TYPE = "Syntax Error"
+
+# Literal text of an f-string that looks like an SQL statement
+_SQL_PATTERN = re.compile(
+    r"\b(select\b.+\bfrom|insert\s+into|update\b.+\bset|delete\s+from|drop\s+table)\b",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Calls that produce a fresh mutable object when used as a default value
+_MUTABLE_FACTORIES = ("list", "dict", "set", "bytearray")
+
+
+def _issue(title: str, issue_type: str, severity: str, line_number: int,
+           description: str, suggested_fix: str) -> Dict:
+    return {
+        "title": title,
+        "type": issue_type,
+        "severity": severity,
+        "lineNumber": line_number,
+        "description": description,
+        "suggestedFix": suggested_fix,
+    }
+
+
+def _is_mutable_default(node: ast.expr) -> bool:
+    if isinstance(node, (ast.List, ast.Dict, ast.Set, ast.ListComp, ast.DictComp, ast.SetComp)):
+        return True
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in _MUTABLE_FACTORIES)
+
+
+def _check_tree(tree: ast.AST) -> List[Dict]:
+    """Pattern checks on a parsed module."""
+    issues = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.JoinedStr):
+            literal = "".join(
+                part.value for part in node.values
+                if isinstance(part, ast.Constant) and isinstance(part.value, str)
+            )
+            if _SQL_PATTERN.search(literal) and any(isinstance(part, ast.FormattedValue) for part in node.values):
+                issues.append(_issue(
+                    "SQL Query Built with f-string", "Security Vulnerability", "High", node.lineno,
+                    "Interpolating values into an SQL statement with an f-string allows SQL injection.",
+                    "Use parameterized queries, e.g. cursor.execute('SELECT ... WHERE id = ?', (value,))."
+                ))
+        elif isinstance(node, ast.ExceptHandler) and node.type is None:
+            issues.append(_issue(
+                "Bare except Clause", "Best Practice", "Medium", node.lineno,
+                "A bare 'except:' also catches SystemExit and KeyboardInterrupt and hides unexpected errors.",
+                "Catch specific exceptions, or at least 'except Exception:'."
+            ))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            defaults = node.args.defaults + [d for d in node.args.kw_defaults if d is not None]
+            for default in defaults:
+                if _is_mutable_default(default):
+                    name = getattr(node, "name", "lambda")
+                    issues.append(_issue(
+                        "Mutable Default Argument", "Bug", "Medium", default.lineno,
+                        f"The mutable default in '{name}' is created once and shared between calls.",
+                        "Default to None and create the object inside the function."
+                    ))
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ("eval", "exec"):
+            issues.append(_issue(
+                f"Use of {node.func.id}()", "Security Vulnerability", "High", node.lineno,
+                f"{node.func.id}() executes arbitrary code; with untrusted input this allows code injection.",
+                "Use ast.literal_eval for literals, or explicit parsing/dispatch instead."
+            ))
+    return issues
+
+
+def _segments(code_snippet: str, separator: Optional[str]) -> List[Tuple[str, int]]:
+    """Split joined snippets; returns (segment, line offset of its first line) pairs."""
+    if not separator or separator not in code_snippet:
+        return [(code_snippet, 0)]
+    segments = []
+    position = 0
+    for segment in code_snippet.split(separator):
+        segments.append((segment, code_snippet.count("\n", 0, position)))
+        position += len(segment) + len(separator)
+    return segments
+
+
+def run_static_checks(code_snippet: str, separator: Optional[str] = None) -> Tuple[List[Dict], bool]:
+    """
+    Check code locally for syntax errors and known bad patterns.
+
+    Args:
+        code_snippet (str): The code to check.
+        separator (str, optional): Marker joining several independent snippets
+            (see SNIPPET_SEPARATOR). Each snippet is then checked on its own
+            and line numbers are reported relative to the joined code.
+
+    Returns:
+        tuple: (issues sorted by line number, whether any snippet parses).
+    """
+    issues = []
+    parseable = False
+    for segment, offset in _segments(code_snippet, separator):
+        try:
+            tree = compile(segment, "<snippet>", "exec", ast.PyCF_ONLY_AST)
+        except (SyntaxError, ValueError) as e:
+            line = getattr(e, "lineno", None)
+            issues.append(_issue(
+                "Syntax Error", SYNTAX_ERROR_TYPE, "Critical", (line or 1) + offset,
+                f"The code cannot be parsed: {getattr(e, 'msg', str(e))}.",
+                "Fix the syntax error so the code can run."
+            ))
+            continue
+        parseable = True
+        for issue in _check_tree(tree):
+            issue["lineNumber"] += offset
+            issues.append(issue)
+    issues.sort(key=lambda issue: issue["lineNumber"])
+    return issues, parseable
+
+
+def format_known_issues(issues: List[Dict]) -> str:
+    """Render issues as a short list for the prompt."""
+    if not issues:
+        return "None"
+    return "\n".join(f"- Line {issue['lineNumber']}: {issue['title']}" for issue in issues)
+
+
+def merge_issues(static_issues: List[Dict], model_issues: List[Dict]) -> List[Dict]:
+    """Static findings plus model issues that do not repeat one (same line and title), by line number."""
+    seen = {(issue["lineNumber"], issue["title"].lower()) for issue in static_issues}
+    merged = list(static_issues)
+    for issue in model_issues:
+        if isinstance(issue, dict) and (issue.get("lineNumber"), str(issue.get("title", "")).lower()) in seen:
+            continue
+        merged.append(issue)
+    merged.sort(key=lambda issue: issue.get("lineNumber") if isinstance(issue, dict) and isinstance(issue.get("lineNumber"), int) else 0)
+    return merged
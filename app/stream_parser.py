@@ -0,0 +1,97 @@
+"""
+Incremental parser for streamed model output.
+Extracts each complete object of a top-level JSON array (e.g. 'issues') as
+soon as its closing brace arrives, without waiting for the whole document.
+"""
+
+import json
+from typing import List
+
+
+class ArrayItemStreamParser:
+    """
+    Feed model text chunk by chunk; get back every array item completed so far.
+
+    The parser scans characters once, tracking string/escape state and nesting
+    depth. It ignores anything outside JSON structure, such as ```json fences
+    or leading prose, and only emits objects that are direct children of the
+    array stored under `key`.
+    """
+
+    def __init__(self, key: str = "issues"):
+        self.key = key
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._awaiting_array = False
+        self._array_depth = None
+        self._object_start = None
+        self.items_emitted = 0
+
+    def feed(self, chunk: str) -> List[dict]:
+        """
+        Consume the next chunk of model output.
+
+        Args:
+            chunk (str): Newly received text.
+
+        Returns:
+            list: Array items that became complete with this chunk, in order.
+        """
+        self._buffer += chunk
+        items = []
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = buffer[self._string_start + 1:i]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":":
+                self._awaiting_array = self._array_depth is None and self._last_string == self.key
+                self._last_string = None
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "[" and self._awaiting_array:
+                    self._array_depth = self._depth
+                elif ch == "{" and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._object_start = i
+                self._awaiting_array = False
+                self._last_string = None
+            elif ch in "}]":
+                if ch == "}" and self._object_start is not None and self._depth == self._array_depth + 1:
+                    try:
+                        item = json.loads(buffer[self._object_start:i + 1])
+                        if isinstance(item, dict):
+                            items.append(item)
+                    except json.JSONDecodeError:
+                        # Malformed item - skip it, keep streaming the rest
+                        pass
+                    self._object_start = None
+                elif ch == "]" and self._array_depth is not None and self._depth == self._array_depth:
+                    self._array_depth = None
+                self._depth -= 1
+                self._last_string = None
+            elif not ch.isspace() and ch != ",":
+                self._awaiting_array = False
+        self._pos = len(buffer)
+        self.items_emitted += len(items)
+        return items
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return self._buffer
@@ -0,0 +1,76 @@
+"""
+Local token estimation.
+Approximates how many tokens a formatted prompt will use, so oversized
+requests can be rejected or split before they reach the model.
+"""
+
+import math
+import re
+
+from langchain_core.prompts import ChatPromptTemplate
+
+# Letters, digits, whitespace runs and single other characters
+_PIECE_PATTERN = re.compile(r"[A-Za-z]+|\d+|\s+|[^\sA-Za-z\d]")
+
+# Characters per token assumed for words and numbers
+_CHARS_PER_WORD_TOKEN = 4
+_CHARS_PER_NUMBER_TOKEN = 3
+
+# Tokens added per chat message for role and framing
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenBudgetError(ValueError):
+    """Raised when a prompt is estimated to exceed the input token budget; maps to HTTP 413."""
+
+    def __init__(self, estimated_tokens: int, budget: int):
+        super().__init__(
+            f"Input is too large: the prompt needs about {estimated_tokens} tokens, "
+            f"the limit is {budget}. Submit less code per request."
+        )
+        self.estimated_tokens = estimated_tokens
+        self.budget = budget
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of model tokens in a text.
+
+    Words cost one token per four letters, numbers one per three digits and
+    every other non-space character one token. Newlines and runs of indentation
+    cost one token each. The estimate is deliberately on the high side for code.
+
+    Args:
+        text (str): Text to measure.
+
+    Returns:
+        int: Estimated token count.
+    """
+    count = 0
+    for piece in _PIECE_PATTERN.findall(text):
+        if piece.isspace():
+            count += piece.count("\n") + (1 if len(piece.strip("\n")) > 1 else 0)
+        elif piece.isalpha():
+            count += math.ceil(len(piece) / _CHARS_PER_WORD_TOKEN)
+        elif piece.isdigit():
+            count += math.ceil(len(piece) / _CHARS_PER_NUMBER_TOKEN)
+        else:
+            count += 1
+    return count
+
+
+def estimate_prompt_tokens(prompt: ChatPromptTemplate, inputs: dict) -> int:
+    """
+    Estimate the input tokens of a prompt template filled with `inputs`.
+
+    Args:
+        prompt (ChatPromptTemplate): One of the templates in app.prompts.
+        inputs (dict): Template variables, as passed to the chain.
+
+    Returns:
+        int: Estimated token count of all formatted messages.
+    """
+    return sum(
+        estimate_tokens(message.content) + _MESSAGE_OVERHEAD_TOKENS
+        for message in prompt.format_messages(**inputs)
+    )
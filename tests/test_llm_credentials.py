@@ -0,0 +1,74 @@
+"""
+Concurrency stress test for per-key Gemini credentials (app.llm._bind_credentials).
+The upstream is a fake transport that answers with the key it was built with,
+so any request served by a client holding another key is detected.
+"""
+
+import asyncio
+import json
+import os
+import random
+
+# Keep the test off the persistent cache tier
+os.environ["CACHE_DB_PATH"] = ""
+
+from google.ai import generativelanguage as glm
+
+from app import llm, services
+
+KEYS = ["key-alpha", "key-beta", "key-gamma"]
+CALLS_PER_KEY = 8
+
+
+class FakeAsyncClient:
+    """Stands in for glm.GenerativeServiceAsyncClient and records the key it was built with."""
+
+    instances = []
+
+    def __init__(self, client_options=None, **kwargs):
+        self.api_key = (client_options or {}).get("api_key")
+        self.requests = 0
+        FakeAsyncClient.instances.append(self)
+
+    async def generate_content(self, request, **kwargs):
+        self.requests += 1
+        # Yield so that calls with different keys interleave
+        await asyncio.sleep(random.uniform(0, 0.01))
+        reply = {"issues": [{
+            "title": self.api_key, "type": "Bug", "severity": "Low", "lineNumber": 1,
+            "description": "Served by the fake upstream.", "suggestedFix": "None."
+        }]}
+        return glm.GenerateContentResponse(candidates=[glm.Candidate(
+            content=glm.Content(role="model", parts=[glm.Part(text=json.dumps(reply))]),
+            finish_reason=glm.Candidate.FinishReason.STOP,
+        )])
+
+
+class FakeSyncClient:
+    def __init__(self, client_options=None, **kwargs):
+        self.api_key = (client_options or {}).get("api_key")
+
+
+def test_concurrent_requests_with_mixed_keys_never_cross(monkeypatch):
+    FakeAsyncClient.instances = []
+    monkeypatch.setattr(llm.glm, "GenerativeServiceAsyncClient", FakeAsyncClient)
+    monkeypatch.setattr(llm.glm, "GenerativeServiceClient", FakeSyncClient)
+    monkeypatch.setattr(services, "client_pool", llm.ClientPool(max_clients=16))
+
+    keys = [key for key in KEYS for _ in range(CALLS_PER_KEY)]
+    random.shuffle(keys)
+
+    async def _run():
+        # Distinct code per call, so neither the result cache nor single-flight merges calls
+        return await asyncio.gather(*[
+            services.analyze_code(f"def f{number}(x):\n    return x + {number}\n", api_key=key)
+            for number, key in enumerate(keys)
+        ])
+
+    results = asyncio.run(_run())
+
+    for key, result in zip(keys, results):
+        assert not result["cached"]
+        assert [issue["title"] for issue in result["issues"]] == [key]
+    assert {client.api_key for client in FakeAsyncClient.instances} <= set(KEYS)
+    assert sum(client.requests for client in FakeAsyncClient.instances) == len(keys)